@@ -3,6 +3,8 @@ from typing import Annotated
 from fastapi import Depends
 from app.api.dependencies.database import get_repository
 from app.repositories.decks import DeckRepository
+from app.repositories.jobs import GenerationJobRepository
+from app.repositories.llm import LLMRepository
 from app.repositories.tokens import TokenRepository
 from app.repositories.users import UserRepository
 
@@ -18,3 +20,11 @@ TokenRepositoryDependency = Annotated[
 DeckRepositoryDependency = Annotated[
     DeckRepository, Depends(get_repository(DeckRepository))
 ]
+
+LLMRepositoryDependency = Annotated[
+    LLMRepository, Depends(get_repository(LLMRepository))
+]
+
+GenerationJobRepositoryDependency = Annotated[
+    GenerationJobRepository, Depends(get_repository(GenerationJobRepository))
+]
@@ -1,8 +1,10 @@
 from datetime import datetime
+from typing import Annotated
 from uuid import UUID
-from fastapi import APIRouter
+from fastapi import APIRouter, Header, Response
 from app.api.dependencies.auth import RequireAuthDependency
 from app.api.dependencies.repositories import DeckRepositoryDependency
+from app.core.utils import etag_matches, get_next_cursor, make_etag
 from app.models.card import CardPublic, UserCardInfoBase, UserCardInfoPublic
 from app.models.deck import (
     DeckCreateRequest,
@@ -45,26 +47,66 @@ async def get_user_decks(
     return await deck_repository.get_user_decks(user_id=user_id)
 
 
+# Tags are read before the content they cover: if the deck changes in
+# between, the client gets newer content under an older tag and simply
+# revalidates again, never stale content under a current tag.
+def deck_etag(deck: DeckPublic) -> str:
+    # user_decks.updated_at is per user and moves without a version bump.
+    updated_at = deck.updated_at or deck.created_at
+    return make_etag(deck.id, deck.version, int(updated_at.timestamp() * 1e6))
+
+
+def cards_etag(deck: DeckPublic) -> str:
+    # Cards only change with the version, the page itself is part of the URL.
+    return make_etag(deck.id, deck.version)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+@router.get("/{deck_id}")
+async def get_deck(
+    deck_id: UUID,
+    user_id: RequireAuthDependency,
+    deck_repository: DeckRepositoryDependency,
+    response: Response,
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> DeckWithCards:
+    deck = await deck_repository.get_user_deck(deck_id=deck_id, user_id=user_id)
+    etag = deck_etag(deck)
+    if etag_matches(if_none_match=if_none_match, etag=etag):
+        return not_modified(etag)
+    cards = await deck_repository.get_deck_cards(deck_id=deck_id)
+    response.headers["ETag"] = etag
+    return DeckWithCards(cards=cards, **deck.model_dump())
+
+
 @router.get("/{deck_id}/cards")
 async def get_deck_cards(
     deck_id: UUID,
     user_id: RequireAuthDependency,
     deck_repository: DeckRepositoryDependency,
+    response: Response,
     from_version: int | None = None,
     page: int | None = None,
+    cursor: str | None = None,
+    if_none_match: Annotated[str | None, Header()] = None,
 ) -> ResponseWithPagination[CardPublic]:
-    if from_version is not None:
-        cards = await deck_repository.get_deck_cards_from_version(
-            deck_id=deck_id, from_version=from_version, page=page
-        )
-        total = await deck_repository.get_total_cards_from_version(
-            deck_id=deck_id, from_version=from_version
-        )
-        return ResponseWithPagination(items=cards, meta=ResponseMeta(**total))
-
-    cards = await deck_repository.get_deck_cards(deck_id=deck_id, page=page)
-    total = await deck_repository.get_total_cards(deck_id=deck_id)
-    return ResponseWithPagination(items=cards, meta=ResponseMeta(**total.model_dump()))
+    deck = await deck_repository.get_user_deck(deck_id=deck_id, user_id=user_id)
+    etag = cards_etag(deck)
+    if etag_matches(if_none_match=if_none_match, etag=etag):
+        return not_modified(etag)
+    cards, total = await deck_repository.get_deck_cards_page(
+        deck_id=deck_id, from_version=from_version, page=page, cursor=cursor
+    )
+    response.headers["ETag"] = etag
+    next_cursor = (
+        get_next_cursor(items=cards) if page is not None or cursor is not None else None
+    )
+    return ResponseWithPagination(
+        items=cards, meta=ResponseMeta(**total.model_dump(), next_cursor=next_cursor)
+    )
 
 
 @router.get("/{deck_id}/card-info")
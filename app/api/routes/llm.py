@@ -1,26 +1,239 @@
-from fastapi import APIRouter, HTTPException
+from typing import AsyncIterator
+from uuid import UUID, uuid4
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 
 from app.api.dependencies.auth import RequireAuthDependency
 from app.api.dependencies.llm import LLMDependency
-from app.models.llm import GenerateFromTextRequest, LMGenerationCardResponse
-from app.models.core import DeckType
+from app.api.dependencies.repositories import (
+    DeckRepositoryDependency,
+    GenerationJobRepositoryDependency,
+    LLMRepositoryDependency,
+)
+from app.models.card import CardCreateRequest
+from app.models.deck import DeckCreateRequest
+from app.models.job import GenerationJobPublic
+from app.models.llm import (
+    GenerateDeckRequest,
+    GenerateDeckResponse,
+    GenerateFromTextRequest,
+    LMGenerationCardResponse,
+    LMStreamEnd,
+    SchedulerStats,
+)
+from app.core.config import settings
+from app.core.utils import run_until_disconnected
+from app.models.core import IDModelMixin, StatusResponse
 from app.services import logger
 
 
 router = APIRouter()
 
 
+@router.get("/health")
+async def get_llm_health(llm: LLMDependency) -> StatusResponse:
+    if not llm.is_ready:
+        raise HTTPException(status_code=503, detail=[{"msg": "Tokenizer is loading"}])
+    return StatusResponse(status="ok")
+
+
+@router.get("/scheduler")
+async def get_scheduler_stats(
+    llm: LLMDependency, user_id: RequireAuthDependency
+) -> SchedulerStats:
+    # Other users' ids and queues are not the caller's business.
+    return llm.scheduler.stats(user_id=user_id)
+
+
 @router.post("/generate-from-text")
 async def generate_cards_from_text(
     request: GenerateFromTextRequest,
+    http_request: Request,
+    response: Response,
     llm: LLMDependency,
+    llm_repository: LLMRepositoryDependency,
     user_id: RequireAuthDependency,
 ) -> list[LMGenerationCardResponse]:
+    # Finished chunks are checkpointed under this id, so a retry that passes it
+    # back only regenerates the chunks that are missing.
+    generation_id = str(request.generationId or uuid4())
+    # Generation is cancelled, model calls included, if the client goes away.
     try:
-        if request.type == DeckType.Flashcards:
-            return llm.generateCardsFromText(text=request.text)
-        else:
-            return llm.generateQuizFromText(text=request.text)
+        generation = llm.generateFromText(
+            text=request.text,
+            type=request.type,
+            user_id=user_id,
+            repository=llm_repository,
+            generation_id=generation_id,
+        )
+        result = await run_until_disconnected(
+            http_request,
+            generation,
+            poll_interval=settings.llm_disconnect_poll_interval,
+        )
+        # Chunks that still failed after retries are skipped, not fatal.
+        response.headers["X-Failed-Chunks"] = str(result.failed_chunks)
+        response.headers["X-Generation-Id"] = generation_id
+        response.headers["X-Tokens-Saved"] = str(result.tokens_saved)
+        response.headers["X-Duplicates-Removed"] = str(result.duplicates_removed)
+        return result.cards
+    except HTTPException as e:
+        e.headers = {**(e.headers or {}), "X-Generation-Id": generation_id}
+        raise
     except Exception as e:
         logger.error(e)
         raise HTTPException(status_code=400, detail=[{"msg": "Error"}])
+
+
+@router.post("/generate-deck", status_code=201)
+async def generate_deck(
+    request: GenerateDeckRequest,
+    http_request: Request,
+    llm: LLMDependency,
+    llm_repository: LLMRepositoryDependency,
+    deck_repository: DeckRepositoryDependency,
+    user_id: RequireAuthDependency,
+) -> GenerateDeckResponse:
+    # Cards are written to the deck chunk by chunk while later chunks are still
+    # generating, and never travel to the client and back.
+    deck_id = await deck_repository.create_deck(
+        deck=DeckCreateRequest(title=request.title, type=request.type, cards=[]),
+        user_id=user_id,
+    )
+    generation_id = str(request.generationId or uuid4())
+
+    async def add_cards(cards: list[LMGenerationCardResponse]) -> None:
+        await deck_repository.add_cards(
+            deck_id=deck_id,
+            deck_type=request.type,
+            cards=[
+                CardCreateRequest(
+                    question=card.question,
+                    options=card.options,
+                    correct_answer=card.correctAnswer,
+                    difficulty=card.difficulty,
+                )
+                for card in cards
+            ],
+        )
+
+    try:
+        result = await run_until_disconnected(
+            http_request,
+            llm.generateFromText(
+                text=request.text,
+                type=request.type,
+                user_id=user_id,
+                repository=llm_repository,
+                generation_id=generation_id,
+                on_cards=add_cards,
+            ),
+            poll_interval=settings.llm_disconnect_poll_interval,
+        )
+    except Exception as e:
+        await deck_repository.delete_deck(deck_id=deck_id, user_id=user_id)
+        if isinstance(e, HTTPException):
+            e.headers = {**(e.headers or {}), "X-Generation-Id": generation_id}
+            raise
+        logger.error(e)
+        raise HTTPException(status_code=400, detail=[{"msg": "Error"}])
+
+    return GenerateDeckResponse(
+        id=deck_id,
+        cards=len(result.cards),
+        failed_chunks=result.failed_chunks,
+        duplicates_removed=result.duplicates_removed,
+        tokens_saved=result.tokens_saved,
+        generation_id=generation_id,
+    )
+
+
+@router.post(
+    "/generate-from-text/stream",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def stream_cards_from_text(
+    request: GenerateFromTextRequest,
+    llm: LLMDependency,
+    llm_repository: LLMRepositoryDependency,
+    user_id: RequireAuthDependency,
+) -> StreamingResponse:
+    generation_id = str(request.generationId or uuid4())
+    try:
+        cards = await llm.streamFromText(
+            text=request.text,
+            type=request.type,
+            user_id=user_id,
+            repository=llm_repository,
+            generation_id=generation_id,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(e)
+        raise HTTPException(status_code=400, detail=[{"msg": "Error"}])
+
+    async def generate() -> AsyncIterator[str]:
+        # Headers are already sent, so the outcome goes into the last line.
+        sent = 0
+        try:
+            async for card in cards:
+                yield card.model_dump_json() + "\n"
+                sent += 1
+            end = LMStreamEnd(status=200, cards=sent)
+        except HTTPException as e:
+            end = LMStreamEnd(status=e.status_code, cards=sent, detail=e.detail)
+        except Exception as e:
+            logger.error(e)
+            end = LMStreamEnd(status=500, cards=sent, detail=[{"msg": "Error"}])
+        finally:
+            # Stops the remaining chunk calls when the client disconnects.
+            await cards.aclose()
+        yield end.model_dump_json() + "\n"
+
+    return StreamingResponse(
+        generate(),
+        media_type="application/x-ndjson",
+        headers={"X-Generation-Id": generation_id},
+    )
+
+
+@router.post("/jobs", status_code=202)
+async def create_generation_job(
+    request: GenerateFromTextRequest,
+    user_id: RequireAuthDependency,
+    job_repository: GenerationJobRepositoryDependency,
+) -> IDModelMixin:
+    id = await job_repository.create_job(request=request, user_id=user_id)
+    return {"id": id}
+
+
+@router.get("/jobs/{job_id}")
+async def get_generation_job(
+    job_id: UUID,
+    user_id: RequireAuthDependency,
+    job_repository: GenerationJobRepositoryDependency,
+) -> GenerationJobPublic:
+    job = await job_repository.get_job(job_id=job_id, user_id=user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=[{"msg": "Not found"}])
+    return job
+
+
+@router.get("/jobs/{job_id}/result")
+async def get_generation_job_result(
+    job_id: UUID,
+    user_id: RequireAuthDependency,
+    job_repository: GenerationJobRepositoryDependency,
+) -> list[LMGenerationCardResponse]:
+    cards = await job_repository.get_job_result(job_id=job_id, user_id=user_id)
+    if cards is not None:
+        return cards
+    job = await job_repository.get_job(job_id=job_id, user_id=user_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=[{"msg": "Not found"}])
+    raise HTTPException(
+        status_code=409,
+        detail=[{"msg": "Job is not completed", "status": job.status}],
+    )
@@ -1,3 +1,4 @@
+from typing import Literal
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -9,6 +10,43 @@ class Settings(BaseSettings):
     access_token_expire_minutes: int
     refresh_token_expire_minutes: int
 
+    ollama_urls: list[str] = ["http://localhost:11434"]
+    llm_health_check_interval: float = 10.0
+    llm_backend_max_failures: int = 3
+    llm_connect_timeout: float = 5.0
+    llm_read_timeout: float = 300.0
+    llm_chunk_timeout: float = 600.0
+    llm_max_retries: int = 2
+    llm_retry_backoff: float = 1.0
+    llm_breaker_reset_seconds: float = 30.0
+    llm_max_connections: int = 16
+    llm_warm_up: bool = True
+    llm_max_concurrency: int = 4
+    llm_global_concurrency: int = 8
+    llm_max_inflight_chunks: int = 256
+    llm_max_inflight_tokens: int = 1_000_000
+    llm_max_user_inflight_chunks: int = 64
+    llm_max_user_inflight_tokens: int = 250_000
+    llm_retry_after_seconds: int = 30
+    llm_disconnect_poll_interval: float = 1.0
+    llm_cache_size: int = 1024
+    llm_cache_ttl_seconds: int = 7 * 86400
+    llm_preprocess: bool = False
+    llm_boilerplate_min_repeats: int = 3
+    llm_near_duplicate_threshold: float = 0.9
+    llm_dedup: bool = True
+    llm_dedup_threshold: float = 0.75
+    llm_response_tokens: int = 1024
+    llm_chunk_overlap_tokens: int = 0
+    llm_token_counting: Literal["exact", "estimate"] = "exact"
+    llm_token_estimate_margin: float = 0.15
+    llm_token_calibration_chars: int = 8000
+    llm_job_workers: int = 1
+    llm_job_lease_seconds: int = 300
+    llm_job_poll_interval: float = 1.0
+    llm_checkpoint_ttl_seconds: int = 86400
+    llm_cleanup_interval: float = 3600.0
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
@@ -1,18 +1,35 @@
+import asyncio
 from typing import Callable
 from fastapi import FastAPI
 
+from app.core.config import settings
 from app.db.tasks import connect_to_db, close_db_connection
+from app.services import llm_service
+from app.services.jobs import GenerationJobWorker
 
 
 def create_start_app_handler(app: FastAPI) -> Callable:
     async def start_app() -> None:
         await connect_to_db(app)
+        await llm_service.start()
+        if settings.llm_warm_up:
+            app.state._llm_warm_up = asyncio.create_task(llm_service.warm_up())
+        if settings.llm_job_workers > 0 and hasattr(app.state, "_db"):
+            app.state._job_worker = GenerationJobWorker(
+                db=app.state._db,
+                llm=llm_service,
+                concurrency=settings.llm_job_workers,
+            )
+            await app.state._job_worker.start()
 
     return start_app
 
 
 def create_stop_app_handler(app: FastAPI) -> Callable:
     async def stop_app() -> None:
+        if hasattr(app.state, "_job_worker"):
+            await app.state._job_worker.stop()
         await close_db_connection(app)
+        await llm_service.close()
 
     return stop_app
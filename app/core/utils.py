@@ -1,6 +1,16 @@
+import asyncio
+import base64
+from datetime import datetime
+import json
+from typing import Awaitable, TypeVar
+from uuid import UUID
+from fastapi import HTTPException
+from starlette.requests import Request
 from app.core.constants import ITEMS_PER_PAGE
 from app.models.core import TotalItems
 
+T = TypeVar("T")
+
 
 def update_values_from_page(*, values: dict, page: int | None) -> dict:
     limit = ITEMS_PER_PAGE
@@ -12,3 +22,65 @@ def update_values_from_page(*, values: dict, page: int | None) -> dict:
 
 def get_total_items(*, total: int) -> TotalItems:
     return TotalItems(total_items=total, total_pages=total // ITEMS_PER_PAGE + 1)
+
+
+def encode_cursor(*, created_at: datetime, id: UUID) -> str:
+    raw = json.dumps([created_at.isoformat(), str(id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, id = json.loads(raw)
+        return datetime.fromisoformat(created_at), UUID(id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail=[{"msg": "Invalid cursor"}])
+
+
+def update_values_from_cursor(*, values: dict, cursor: str) -> dict:
+    after_created_at, after_id = decode_cursor(cursor)
+    values.update(
+        {
+            "limit": ITEMS_PER_PAGE,
+            "after_created_at": after_created_at,
+            "after_id": after_id,
+        }
+    )
+    return values
+
+
+def get_next_cursor(*, items: list) -> str | None:
+    # A short page is the last one, otherwise continue after its last item.
+    if len(items) < ITEMS_PER_PAGE:
+        return None
+    return encode_cursor(created_at=items[-1].created_at, id=items[-1].id)
+
+
+def make_etag(*parts: object) -> str:
+    # Weak: equal versions mean equal content, not byte-identical responses.
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def etag_matches(*, if_none_match: str | None, etag: str) -> bool:
+    if if_none_match is None:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+async def run_until_disconnected(
+    request: Request, aw: Awaitable[T], *, poll_interval: float = 1.0
+) -> T:
+    task = asyncio.ensure_future(aw)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise HTTPException(
+                    status_code=499, detail=[{"msg": "Client closed request"}]
+                )
+    finally:
+        task.cancel()
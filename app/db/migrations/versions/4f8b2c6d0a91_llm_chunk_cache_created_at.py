@@ -0,0 +1,33 @@
+"""llm chunk cache created_at index
+
+Revision ID: 4f8b2c6d0a91
+Revises: c7d4a1e9b362
+Create Date: 2026-10-18 19:40:51.207365
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4f8b2c6d0a91"
+down_revision: Union[str, None] = "c7d4a1e9b362"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_llm_chunk_cache_created_at",
+        "llm_chunk_cache",
+        ["created_at"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_llm_chunk_cache_created_at", "llm_chunk_cache", if_exists=True)
@@ -0,0 +1,50 @@
+"""generation chunk checkpoints
+
+Revision ID: 5e7a9c1b4f20
+Revises: d19b6f0c3e82
+Create Date: 2026-10-18 15:40:12.904117
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5e7a9c1b4f20"
+down_revision: Union[str, None] = "d19b6f0c3e82"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "generation_chunks",
+        sa.Column("generation_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("chunk_index", sa.Integer, nullable=False),
+        sa.Column(
+            "user_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            nullable=False,
+        ),
+        sa.Column("key", sa.String(64), nullable=False),
+        sa.Column("cards", postgresql.JSONB, nullable=False),
+        sa.Column(
+            "created_at",
+            sa.TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=sa.text("NOW()"),
+        ),
+        sa.PrimaryKeyConstraint("generation_id", "chunk_index"),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("generation_chunks", if_exists=True)
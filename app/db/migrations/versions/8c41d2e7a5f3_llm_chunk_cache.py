@@ -0,0 +1,46 @@
+"""llm chunk cache
+
+Revision ID: 8c41d2e7a5f3
+Revises: 2fb1794ea6b7
+Create Date: 2026-10-18 10:12:41.218390
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8c41d2e7a5f3"
+down_revision: Union[str, None] = "2fb1794ea6b7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+deck_type_enum = postgresql.ENUM(
+    "Quiz", "Flashcards", name="deck_type", create_type=False
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "llm_chunk_cache",
+        sa.Column("key", sa.String(64), primary_key=True),
+        sa.Column("type", deck_type_enum, nullable=False),
+        sa.Column("cards", postgresql.JSONB, nullable=False),
+        sa.Column(
+            "created_at",
+            sa.TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=sa.text("NOW()"),
+        ),
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("llm_chunk_cache", if_exists=True)
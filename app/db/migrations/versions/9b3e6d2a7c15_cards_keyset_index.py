@@ -0,0 +1,33 @@
+"""cards keyset index
+
+Revision ID: 9b3e6d2a7c15
+Revises: 5e7a9c1b4f20
+Create Date: 2026-10-18 17:05:41.118203
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "9b3e6d2a7c15"
+down_revision: Union[str, None] = "5e7a9c1b4f20"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_cards_deck_id_created_at_id",
+        "cards",
+        ["deck_id", "created_at", "id"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_cards_deck_id_created_at_id", "cards", if_exists=True)
@@ -0,0 +1,35 @@
+"""generation chunks created_at index
+
+Revision ID: c7d4a1e9b362
+Revises: 9b3e6d2a7c15
+Create Date: 2026-10-18 19:12:08.530914
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c7d4a1e9b362"
+down_revision: Union[str, None] = "9b3e6d2a7c15"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_generation_chunks_created_at",
+        "generation_chunks",
+        ["created_at"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(
+        "ix_generation_chunks_created_at", "generation_chunks", if_exists=True
+    )
@@ -0,0 +1,94 @@
+"""generation jobs
+
+Revision ID: d19b6f0c3e82
+Revises: 8c41d2e7a5f3
+Create Date: 2026-10-18 11:04:27.903114
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d19b6f0c3e82"
+down_revision: Union[str, None] = "8c41d2e7a5f3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+deck_type_enum = postgresql.ENUM(
+    "Quiz", "Flashcards", name="deck_type", create_type=False
+)
+job_status_enum = postgresql.ENUM(
+    "Pending",
+    "Running",
+    "Completed",
+    "Failed",
+    name="generation_job_status",
+    create_type=False,
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    job_status_enum.create(op.get_bind(), checkfirst=True)
+    op.create_table(
+        "generation_jobs",
+        sa.Column(
+            "id",
+            postgresql.UUID(as_uuid=True),
+            primary_key=True,
+            server_default=sa.text("gen_random_uuid()"),
+        ),
+        sa.Column(
+            "created_at",
+            sa.TIMESTAMP(timezone=True),
+            nullable=False,
+            server_default=sa.text("NOW()"),
+        ),
+        sa.Column("updated_at", sa.TIMESTAMP(timezone=True)),
+        sa.Column(
+            "user_id",
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey("users.id", ondelete="CASCADE"),
+            nullable=False,
+            index=True,
+        ),
+        sa.Column("type", deck_type_enum, nullable=False),
+        sa.Column("text", sa.Text, nullable=False),
+        sa.Column(
+            "status",
+            job_status_enum,
+            nullable=False,
+            server_default="Pending",
+        ),
+        sa.Column("chunks_done", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("chunks_total", sa.Integer, nullable=False, server_default="0"),
+        sa.Column("lease_expires_at", sa.TIMESTAMP(timezone=True)),
+        sa.Column("result", postgresql.JSONB),
+        sa.Column("error", sa.Text),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "generation_jobs_status_created_at_idx",
+        "generation_jobs",
+        ["status", "created_at"],
+        if_not_exists=True,
+    )
+    op.execute(
+        """
+        CREATE TRIGGER set_timestamp
+        BEFORE UPDATE ON generation_jobs
+        FOR EACH ROW
+        EXECUTE PROCEDURE update_timestamp();
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("generation_jobs", if_exists=True)
+    job_status_enum.drop(op.get_bind(), checkfirst=True)
@@ -1,8 +1,9 @@
 import logging
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from app.api.routes import router as api_router
 from app.core import tasks
-from app.services import logger
+from app.services import logger, metrics
 
 
 logger.setLevel(logging.DEBUG)
@@ -14,4 +15,12 @@ app.add_event_handler("shutdown", tasks.create_stop_app_handler(app))
 app.get("/health")(lambda: {"status": "ok"})
 
 
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> PlainTextResponse:
+    # Collectors read event loop state, so they must not run in the threadpool.
+    return PlainTextResponse(
+        metrics.registry.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
 app.include_router(api_router, prefix="/api")
@@ -28,6 +28,7 @@ class QuestionOptionPublic(IDModelMixin):
 
 
 class CardPublic(CardBase, IDModelMixin):
+    created_at: datetime
     correct_answer_id: UUID
     options: list[QuestionOptionPublic] | Json[list[QuestionOptionPublic]]
     is_deleted: bool
@@ -22,7 +22,8 @@ class TotalItems(CoreModel):
 
 
 class ResponseMeta(TotalItems):
-    pass
+    # Opaque, pass it back as `cursor` to get the next page.
+    next_cursor: str | None = None
 
 
 T = TypeVar("T", bound=CoreModel)
@@ -0,0 +1,26 @@
+from datetime import datetime
+from enum import Enum
+from uuid import UUID
+from app.models.core import DeckType, IDModelMixin
+
+
+class GenerationJobStatus(str, Enum):
+    Pending = "Pending"
+    Running = "Running"
+    Completed = "Completed"
+    Failed = "Failed"
+
+
+class GenerationJobPublic(IDModelMixin):
+    created_at: datetime
+    updated_at: datetime | None
+    type: DeckType
+    status: GenerationJobStatus
+    chunks_done: int
+    chunks_total: int
+    error: str | None
+
+
+class GenerationJobModel(GenerationJobPublic):
+    user_id: UUID
+    text: str
@@ -1,9 +1,33 @@
-from app.models.core import CoreModel, DeckType
+from uuid import UUID
+from pydantic import Field
+from app.core.config import settings
+from app.models.core import CoreModel, DeckType, IDModelMixin
+
+# No tokenizer packs more characters than this into a token on average, so a
+# longer text is over the per user token budget for sure. Rejecting it during
+# validation saves preprocessing and tokenizing it only to answer 413.
+MAX_CHARS_PER_TOKEN = 8
 
 
 class GenerateFromTextRequest(CoreModel):
-    text: str
+    text: str = Field(
+        max_length=settings.llm_max_user_inflight_tokens * MAX_CHARS_PER_TOKEN
+    )
     type: DeckType
+    # Pass the id of an interrupted generation to only re-run its missing chunks.
+    generationId: UUID | None = None
+
+
+class GenerateDeckRequest(GenerateFromTextRequest):
+    title: str
+
+
+class GenerateDeckResponse(IDModelMixin):
+    cards: int
+    failed_chunks: int
+    duplicates_removed: int
+    tokens_saved: int
+    generation_id: UUID
 
 
 class LMQuizCardResponse(CoreModel):
@@ -24,3 +48,34 @@ class LMGenerationCardResponse(CoreModel):
     correctAnswer: int
     difficulty: int
     tempId: int
+
+
+class LMStreamEnd(CoreModel):
+    """Last line of a card stream. A stream without it was cut off."""
+
+    status: int
+    cards: int
+    detail: list[dict] | str | None = None
+
+
+class LMGenerationResult(CoreModel):
+    cards: list[LMGenerationCardResponse]
+    failed_chunks: int
+    tokens_saved: int = 0
+    duplicates_removed: int = 0
+
+
+class SchedulerUserStats(CoreModel):
+    user_id: str
+    queued: int
+    in_flight: int
+    dispatched: int
+    avg_wait_seconds: float
+    max_wait_seconds: float
+
+
+class SchedulerStats(CoreModel):
+    concurrency: int
+    in_flight: int
+    queued: int
+    users: list[SchedulerUserStats]
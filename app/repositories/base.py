@@ -1,6 +1,23 @@
+import asyncio
+from typing import Any, Coroutine
+
 from databases import Database
 
 
 class BaseRepository:
     def __init__(self, db: Database) -> None:
         self.db = db
+
+    async def gather(self, *queries: Coroutine[Any, Any, Any]) -> list[Any]:
+        """Runs independent queries concurrently and returns their results in
+        order. The database binds connections to tasks, so each query checks
+        out its own pooled connection: only use it outside of a transaction,
+        whose connection the queries would not share."""
+        tasks = [asyncio.create_task(query) for query in queries]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            # The first error is raised as is, the other queries are not needed.
+            for task in tasks:
+                task.cancel()
+            raise
@@ -1,4 +1,5 @@
 import asyncio
+from uuid import uuid4
 from databases.core import Connection
 from app.db.tables import cards_table, question_options_table
 from app.models.card import CardCreateRequest, CardUpdateRequest
@@ -32,27 +33,71 @@ class CardRepository(BaseRepository):
         deck_type: str,
         cards: list[CardCreateRequest],
     ) -> list[str]:
-        result: list[str] = []
-        for card in cards:
-            card_result = await connection.fetch_one(
-                cards_table.insert()
-                .values(
-                    {
-                        "type": deck_type,
-                        "question": card.question,
-                        "difficulty": card.difficulty,
-                        "deck_id": deck_id,
-                    }
-                )
-                .returning(cards_table.c.id),
+        # Ids are generated here so cards, options and correct_answer_id can be
+        # written with three set-based statements instead of a round trip per
+        # row. correct_answer_id is set last, its foreign key is not deferrable.
+        # clock_timestamp() keeps created_at increasing in the given card order.
+        if not cards:
+            return []
+        card_ids = [uuid4() for _ in cards]
+        option_ids = [[uuid4() for _ in card.options] for card in cards]
+        await connection.execute(
+            """
+            INSERT INTO cards (id, type, question, difficulty, deck_id, created_at)
+            SELECT t.id, CAST(:type AS deck_type), t.question, t.difficulty,
+                :deck_id, clock_timestamp()
+            FROM unnest(
+                CAST(:ids AS uuid[]), CAST(:questions AS text[]),
+                CAST(:difficulties AS smallint[])
+            ) AS t(id, question, difficulty)
+            """,
+            {
+                "type": deck_type,
+                "deck_id": deck_id,
+                "ids": card_ids,
+                "questions": [card.question for card in cards],
+                "difficulties": [card.difficulty for card in cards],
+            },
+        )
+        await connection.execute(
+            """
+            INSERT INTO question_options (id, card_id, answer)
+            SELECT * FROM unnest(
+                CAST(:ids AS uuid[]), CAST(:card_ids AS uuid[]),
+                CAST(:answers AS text[])
             )
-            result.append(card_result.id)
-            await asyncio.create_task(
-                self.add_question_options(
-                    connection=connection,
-                    card=CardUpdateRequest(id=card_result.id, **card.model_dump()),
-                )
+            """,
+            {
+                "ids": [id for ids in option_ids for id in ids],
+                "card_ids": [
+                    card_id
+                    for card_id, ids in zip(card_ids, option_ids)
+                    for _ in ids
+                ],
+                "answers": [option for card in cards for option in card.options],
+            },
+        )
+        correct = [
+            (card_id, ids[card.correct_answer])
+            for card, card_id, ids in zip(cards, card_ids, option_ids)
+            if 0 <= card.correct_answer < len(ids)
+        ]
+        if correct:
+            await connection.execute(
+                """
+                UPDATE cards
+                SET correct_answer_id = t.option_id
+                FROM unnest(
+                    CAST(:card_ids AS uuid[]), CAST(:option_ids AS uuid[])
+                ) AS t(card_id, option_id)
+                WHERE cards.id = t.card_id
+                """,
+                {
+                    "card_ids": [card_id for card_id, _ in correct],
+                    "option_ids": [option_id for _, option_id in correct],
+                },
             )
+        return card_ids
 
     async def create_card_migrations(
         self, *, connection: Connection, migration_id: str, cards_id: list[str]
@@ -1,12 +1,18 @@
 import asyncio
 from datetime import datetime
+from uuid import UUID
 
 from databases import Database
 from fastapi import HTTPException
-from app.core.utils import get_total_items, update_values_from_page
+from app.core.utils import (
+    get_total_items,
+    update_values_from_cursor,
+    update_values_from_page,
+)
 from app.db.tables import decks_table, user_decks_table
 
 from app.models.card import (
+    CardCreateRequest,
     CardPublic,
     UserCardInfoBase,
     UserCardInfoPublic,
@@ -30,11 +36,17 @@ class DeckRepository(BaseRepository):
         self.card_repository = CardRepository(db)
 
     async def get_deck_by_id(self, *, deck_id: str, user_id: str) -> DeckWithCards:
+        deck, cards = await self.gather(
+            self.get_user_deck(user_id=user_id, deck_id=deck_id),
+            self.get_deck_cards(deck_id=deck_id),
+        )
+        return DeckWithCards(cards=cards, **deck.model_dump())
+
+    async def get_user_deck(self, *, deck_id: str, user_id: str) -> DeckPublic:
         deck = await self.get_user_decks(user_id=user_id, deck_id=deck_id)
         if (not deck) or len(deck) != 1:
             raise HTTPException(status_code=404, detail=[{"msg": "Not found"}])
-        cards = await self.get_deck_cards(deck_id=deck_id)
-        return DeckWithCards(cards=cards, **deck[0].model_dump())
+        return deck[0]
 
     async def create_deck(self, *, deck: DeckCreateRequest, user_id: str) -> str:
         async with self.db.transaction():
@@ -62,6 +74,49 @@ class DeckRepository(BaseRepository):
 
             return result.id
 
+    async def add_cards(
+        self, *, deck_id: str, deck_type: str, cards: list[CardCreateRequest]
+    ) -> list[str]:
+        async with self.db.transaction():
+            # Cards added to an existing deck are a new version like any other
+            # change, so clients syncing from a version receive them.
+            deck = await self.db.fetch_one(
+                """
+                UPDATE decks
+                SET version = version + 1
+                WHERE id = :deck_id
+                RETURNING version
+                """,
+                {"deck_id": deck_id},
+            )
+            migration = await self.db.fetch_one(
+                """
+                INSERT INTO deck_migrations (deck_id, version)
+                VALUES (:deck_id, :version)
+                RETURNING id
+                """,
+                {"deck_id": deck_id, "version": deck.version},
+            )
+            card_ids = await self.card_repository.add_cards_to_deck(
+                connection=self.db.connection(),
+                deck_id=deck_id,
+                deck_type=deck_type,
+                cards=cards,
+            )
+            await self.card_repository.create_card_migrations(
+                connection=self.db.connection(),
+                migration_id=migration.id,
+                cards_id=card_ids,
+            )
+            return card_ids
+
+    async def delete_deck(self, *, deck_id: str, user_id: str) -> None:
+        await self.db.execute(
+            decks_table.delete().where(
+                decks_table.c.id == deck_id, decks_table.c.user_id == user_id
+            )
+        )
+
     async def get_decks_by_user_id(self, *, user_id: str) -> list[DeckPublic]:
         result = await self.db.fetch_all(
             decks_table.select().where(decks_table.c.user_id == user_id)
@@ -84,73 +139,97 @@ class DeckRepository(BaseRepository):
         result = await self.db.fetch_all(stmt)
         return [DeckPublic(**deck) for deck in result]
 
-    async def get_deck_cards(
-        self, *, deck_id: str, page: int | None = None
-    ) -> list[CardPublic]:
+    def __page_clauses(
+        self, *, values: dict, page: int | None, cursor: str | None
+    ) -> tuple[str, str]:
+        # Keyset pages on (created_at, id) cost the same index range scan at any
+        # depth, page numbers are still accepted but degrade with OFFSET.
+        if cursor is not None:
+            update_values_from_cursor(values=values, cursor=cursor)
+            after = "AND (c.created_at, c.id) > (:after_created_at, :after_id)"
+            return after, "LIMIT :limit"
+        update_values_from_page(values=values, page=page)
+        return "", "LIMIT :limit OFFSET :offset" if page is not None else ""
+
+    def __version_clause(self, *, values: dict, from_version: int | None) -> str:
+        if from_version is None:
+            return ""
+        values["from_version"] = from_version
+        return """
+            AND EXISTS (
+                SELECT 1
+                FROM deck_migrations AS m
+                JOIN deck_migration_updates AS mu ON m.id = mu.deck_migration_id
+                WHERE m.deck_id = :deck_id AND m.version > :from_version
+                    AND mu.card_id = c.id
+            )
+        """
+
+    async def get_deck_cards(self, *, deck_id: str) -> list[CardPublic]:
         result = await self.db.fetch_all(
-            f"""
-            SELECT c.*,
-            json_agg(DISTINCT jsonb_build_object(
-				'id', qo.id, 'answer', qo.answer
-            )) AS options
+            """
+            SELECT c.*, o.options
             FROM cards AS c
-            LEFT JOIN question_options AS qo ON c.id = qo.card_id
+            LEFT JOIN LATERAL (
+                SELECT COALESCE(json_agg(
+                    jsonb_build_object('id', qo.id, 'answer', qo.answer)
+                    ORDER BY qo.id
+                ), '[]') AS options
+                FROM question_options AS qo
+                WHERE qo.card_id = c.id
+            ) AS o ON TRUE
             WHERE c.deck_id = :deck_id
-            GROUP BY c.id
-            {"LIMIT :limit OFFSET :offset" if page is not None else ""}
+            ORDER BY c.created_at, c.id
             """,
-            update_values_from_page(values={"deck_id": deck_id}, page=page),
+            {"deck_id": deck_id},
         )
         return [CardPublic(**card) for card in result]
 
-    async def get_total_cards(self, *, deck_id: str) -> TotalItems:
-        result = await self.db.fetch_one(
-            """
-            SELECT COUNT(id) AS total
-            FROM cards
-            WHERE deck_id = :deck_id
-            """,
-            values={"deck_id": deck_id},
-        )
-        return get_total_items(total=result.total)
-
-    async def get_deck_cards_from_version(
-        self, *, deck_id: str, from_version: int, page: int | None
-    ) -> list[CardPublic]:
+    async def get_deck_cards_page(
+        self,
+        *,
+        deck_id: str,
+        from_version: int | None = None,
+        page: int | None = None,
+        cursor: str | None = None,
+    ) -> tuple[list[CardPublic], TotalItems]:
+        """A page of the deck's cards, changed after `from_version` if given, and
+        the total they are paged from, in one round trip."""
+        values = {"deck_id": deck_id}
+        changed = self.__version_clause(values=values, from_version=from_version)
+        after, limit = self.__page_clauses(values=values, page=page, cursor=cursor)
+        # The count is joined to the page rather than the other way around, so
+        # an empty page still returns one row carrying the total.
         result = await self.db.fetch_all(
             f"""
-            SELECT DISTINCT ON (c.id) c.*,
-            json_agg(DISTINCT jsonb_build_object(
-				'id', qo.id, 'answer', qo.answer
-            )) AS options
-            FROM deck_migrations AS m
-            LEFT JOIN deck_migration_updates AS mu ON m.id = mu.deck_migration_id
-            LEFT JOIN cards AS c ON mu.card_id = c.id
-            LEFT JOIN question_options AS qo ON c.id = qo.card_id
-            WHERE version > :from_version AND deck_id = :deck_id
-            GROUP BY c.id
-            {"LIMIT :limit OFFSET :offset" if page is not None else ""}
-            """,
-            update_values_from_page(
-                values={"from_version": from_version, "deck_id": deck_id}, page=page
-            ),
-        )
-        return [CardPublic(**card) for card in result]
-
-    async def get_total_cards_from_version(
-        self, *, deck_id: str, from_version: int
-    ) -> TotalItems:
-        result = await self.db.fetch_one(
-            """
-            SELECT COUNT(DISTINCT c.id) AS total
-            FROM deck_migrations AS m
-            LEFT JOIN deck_migration_updates AS mu ON m.id = mu.deck_migration_id
-            LEFT JOIN cards AS c ON mu.card_id = c.id
-            WHERE version > :from_version AND deck_id = :deck_id
+            WITH page AS (
+                SELECT c.*
+                FROM cards AS c
+                WHERE c.deck_id = :deck_id {changed} {after}
+                ORDER BY c.created_at, c.id
+                {limit}
+            ), total AS (
+                SELECT COUNT(*) AS total
+                FROM cards AS c
+                WHERE c.deck_id = :deck_id {changed}
+            )
+            SELECT t.total, p.*, o.options
+            FROM total AS t
+            LEFT JOIN page AS p ON TRUE
+            LEFT JOIN LATERAL (
+                SELECT COALESCE(json_agg(
+                    jsonb_build_object('id', qo.id, 'answer', qo.answer)
+                    ORDER BY qo.id
+                ), '[]') AS options
+                FROM question_options AS qo
+                WHERE qo.card_id = p.id
+            ) AS o ON TRUE
+            ORDER BY p.created_at, p.id
             """,
-            values={"from_version": from_version, "deck_id": deck_id},
+            values,
         )
-        return get_total_items(total=result.total)
+        cards = [CardPublic(**card) for card in result if card.id is not None]
+        return cards, get_total_items(total=result[0].total)
 
     async def get_deck_card_info(
         self, *, user_id: str, deck_id: str, after_date: datetime
@@ -174,57 +253,76 @@ class DeckRepository(BaseRepository):
     async def update_card_info(
         self, *, user_id: str, deck_id: str, cards: list[UserCardInfoBase]
     ) -> None:
-        async with self.db.transaction():
-            for card in cards:
-                await self.db.execute(
-                    """
-                    INSERT INTO user_card_info (user_id, card_id, 
-                        last_answered_at, repetition_number, easiness_factor,
-                        interval, is_learning, learning_step
-                    )
-                    VALUES (:user_id, :card_id,
-                        :last_answered_at, :repetition_number, :easiness_factor,
-                        :interval, :is_learning, :learning_step
-                    )
-                    ON CONFLICT (card_id, user_id) DO UPDATE
-                    SET last_answered_at = :last_answered_at,
-                        repetition_number = :repetition_number,
-                        easiness_factor = :easiness_factor,
-                        interval = :interval,
-                        is_learning = :is_learning,
-                        learning_step = :learning_step
-                    """,
-                    {
-                        **card.model_dump(),
-                        "user_id": user_id,
-                    },
-                )
+        # Offline clients can send the same card twice, the latest answer wins.
+        latest: dict[UUID, UserCardInfoBase] = {}
+        for card in cards:
+            seen = latest.get(card.card_id)
+            if seen is None or card.last_answered_at >= seen.last_answered_at:
+                latest[card.card_id] = card
+        cards = list(latest.values())
 
-            await self.db.execute(
-                """
-                UPDATE user_decks
-                SET updated_at = now()
-                WHERE user_id = :user_id AND deck_id = :deck_id
-                """,
-                {"user_id": user_id, "deck_id": deck_id},
+        # One statement for the whole batch, older answers never overwrite newer.
+        await self.db.execute(
+            """
+            WITH upserted AS (
+                INSERT INTO user_card_info (user_id, card_id,
+                    last_answered_at, repetition_number, easiness_factor,
+                    interval, is_learning, learning_step
+                )
+                SELECT CAST(:user_id AS uuid), t.* FROM unnest(
+                    CAST(:card_ids AS uuid[]),
+                    CAST(:last_answered_at AS timestamptz[]),
+                    CAST(:repetition_number AS integer[]),
+                    CAST(:easiness_factor AS real[]),
+                    CAST(:interval AS real[]),
+                    CAST(:is_learning AS boolean[]),
+                    CAST(:learning_step AS integer[])
+                ) AS t
+                ON CONFLICT (card_id, user_id) DO UPDATE
+                SET last_answered_at = EXCLUDED.last_answered_at,
+                    repetition_number = EXCLUDED.repetition_number,
+                    easiness_factor = EXCLUDED.easiness_factor,
+                    interval = EXCLUDED.interval,
+                    is_learning = EXCLUDED.is_learning,
+                    learning_step = EXCLUDED.learning_step
+                WHERE user_card_info.last_answered_at <= EXCLUDED.last_answered_at
             )
+            UPDATE user_decks
+            SET updated_at = now()
+            WHERE user_id = :user_id AND deck_id = :deck_id
+            """,
+            {
+                "user_id": user_id,
+                "deck_id": deck_id,
+                "card_ids": [c.card_id for c in cards],
+                "last_answered_at": [c.last_answered_at for c in cards],
+                "repetition_number": [c.repetition_number for c in cards],
+                "easiness_factor": [c.easiness_factor for c in cards],
+                "interval": [c.interval for c in cards],
+                "is_learning": [c.is_learning for c in cards],
+                "learning_step": [c.learning_step for c in cards],
+            },
+        )
 
     async def update_deck(
         self, *, deck_id: str, user_id: str, deck: DeckUpdateRequest
     ) -> None:
-        increase_version = deck.patch_cards or deck.deleted_cards
+        cards_changed = deck.new_cards or deck.update_cards or deck.deleted_cards
         async with self.db.transaction():
-            deck_result = await self.db.execute(
-                f"""
+            # Every update is a new version, the title is part of what ETags
+            # cover. Only card changes are recorded as a migration.
+            deck_result = await self.db.fetch_one(
+                """
                 UPDATE decks
-                SET title = :title
-                {", version = version + 1" if increase_version else ""}
+                SET title = :title, version = version + 1
                 WHERE id = :deck_id AND user_id = :user_id
                 RETURNING version, type
                 """,
                 {"title": deck.title, "deck_id": deck_id, "user_id": user_id},
             )
-            if not increase_version:
+            if deck_result is None:
+                raise HTTPException(status_code=404, detail=[{"msg": "Not found"}])
+            if not cards_changed:
                 return
             migration_result = await self.db.fetch_one(
                 """
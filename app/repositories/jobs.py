@@ -0,0 +1,139 @@
+import json
+from pydantic_core import from_json
+from app.models.job import GenerationJobModel, GenerationJobPublic
+from app.models.llm import GenerateFromTextRequest, LMGenerationCardResponse
+from app.repositories.base import BaseRepository
+
+
+class GenerationJobRepository(BaseRepository):
+    async def create_job(
+        self, *, request: GenerateFromTextRequest, user_id: str
+    ) -> str:
+        result = await self.db.fetch_one(
+            """
+            INSERT INTO generation_jobs (user_id, type, text)
+            VALUES (:user_id, :type, :text)
+            RETURNING id
+            """,
+            values={"user_id": user_id, "type": request.type, "text": request.text},
+        )
+        return result.id
+
+    async def get_job(self, *, job_id: str, user_id: str) -> GenerationJobPublic | None:
+        result = await self.db.fetch_one(
+            """
+            SELECT id, created_at, updated_at, type, status,
+                chunks_done, chunks_total, error
+            FROM generation_jobs
+            WHERE id = :job_id AND user_id = :user_id
+            """,
+            values={"job_id": job_id, "user_id": user_id},
+        )
+        if not result:
+            return None
+        return GenerationJobPublic(**result)
+
+    async def get_job_result(
+        self, *, job_id: str, user_id: str
+    ) -> list[LMGenerationCardResponse] | None:
+        result = await self.db.fetch_one(
+            """
+            SELECT result FROM generation_jobs
+            WHERE id = :job_id AND user_id = :user_id AND status = 'Completed'
+            """,
+            values={"job_id": job_id, "user_id": user_id},
+        )
+        if not result:
+            return None
+        cards = result.result
+        cards = from_json(cards) if isinstance(cards, str) else cards
+        return [LMGenerationCardResponse(**card) for card in cards]
+
+    async def claim_next_job(self, *, lease_seconds: int) -> GenerationJobModel | None:
+        # Running jobs whose lease expired belonged to a worker that died.
+        result = await self.db.fetch_one(
+            """
+            UPDATE generation_jobs
+            SET status = 'Running', chunks_done = 0,
+                lease_expires_at = now() + make_interval(secs => :lease_seconds)
+            WHERE id = (
+                SELECT id FROM generation_jobs
+                WHERE status = 'Pending'
+                    OR (status = 'Running' AND lease_expires_at < now())
+                ORDER BY created_at
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            )
+            RETURNING id, created_at, updated_at, type, status,
+                chunks_done, chunks_total, error, user_id, text
+            """,
+            values={"lease_seconds": lease_seconds},
+        )
+        if not result:
+            return None
+        return GenerationJobModel(**result)
+
+    async def renew_lease(self, *, job_id: str, lease_seconds: int) -> None:
+        await self.db.execute(
+            """
+            UPDATE generation_jobs
+            SET lease_expires_at = now() + make_interval(secs => :lease_seconds)
+            WHERE id = :job_id AND status = 'Running'
+            """,
+            values={"job_id": job_id, "lease_seconds": lease_seconds},
+        )
+
+    async def release_job(self, *, job_id: str) -> None:
+        await self.db.execute(
+            """
+            UPDATE generation_jobs
+            SET status = 'Pending', lease_expires_at = NULL
+            WHERE id = :job_id AND status = 'Running'
+            """,
+            values={"job_id": job_id},
+        )
+
+    async def update_progress(
+        self, *, job_id: str, chunks_done: int, chunks_total: int
+    ) -> None:
+        # Chunks finish concurrently, so an older count can commit after a newer
+        # one. A new claim resets the count, so progress only moves forward.
+        await self.db.execute(
+            """
+            UPDATE generation_jobs
+            SET chunks_done = GREATEST(chunks_done, :chunks_done),
+                chunks_total = :chunks_total
+            WHERE id = :job_id
+            """,
+            values={
+                "job_id": job_id,
+                "chunks_done": chunks_done,
+                "chunks_total": chunks_total,
+            },
+        )
+
+    async def complete_job(
+        self, *, job_id: str, cards: list[LMGenerationCardResponse]
+    ) -> None:
+        await self.db.execute(
+            """
+            UPDATE generation_jobs
+            SET status = 'Completed', result = CAST(:result AS jsonb),
+                lease_expires_at = NULL
+            WHERE id = :job_id
+            """,
+            values={
+                "job_id": job_id,
+                "result": json.dumps([card.model_dump() for card in cards]),
+            },
+        )
+
+    async def fail_job(self, *, job_id: str, error: str) -> None:
+        await self.db.execute(
+            """
+            UPDATE generation_jobs
+            SET status = 'Failed', error = :error, lease_expires_at = NULL
+            WHERE id = :job_id
+            """,
+            values={"job_id": job_id, "error": error},
+        )
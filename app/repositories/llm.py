@@ -0,0 +1,108 @@
+import json
+from pydantic_core import from_json
+from app.models.core import DeckType
+from app.repositories.base import BaseRepository
+
+
+class LLMRepository(BaseRepository):
+    async def get_cached_chunk(
+        self, *, key: str, ttl_seconds: int
+    ) -> list[dict] | None:
+        # Expired rows may still be there until the next clean up.
+        result = await self.db.fetch_one(
+            """
+            SELECT cards FROM llm_chunk_cache
+            WHERE key = :key
+                AND created_at >= NOW() - make_interval(secs => :ttl_seconds)
+            """,
+            values={"key": key, "ttl_seconds": ttl_seconds},
+        )
+        if not result:
+            return None
+        cards = result.cards
+        return from_json(cards) if isinstance(cards, str) else cards
+
+    async def cache_chunk(self, *, key: str, type: DeckType, cards: list[dict]) -> None:
+        await self.db.execute(
+            """
+            INSERT INTO llm_chunk_cache (key, type, cards)
+            VALUES (:key, :type, CAST(:cards AS jsonb))
+            ON CONFLICT (key) DO UPDATE
+            SET type = EXCLUDED.type, cards = EXCLUDED.cards, created_at = NOW()
+            """,
+            values={"key": key, "type": type.value, "cards": json.dumps(cards)},
+        )
+
+    async def delete_expired_chunks(self, *, ttl_seconds: int) -> None:
+        await self.db.execute(
+            """
+            DELETE FROM llm_chunk_cache
+            WHERE created_at < NOW() - make_interval(secs => :ttl_seconds)
+            """,
+            values={"ttl_seconds": ttl_seconds},
+        )
+
+    async def get_checkpoints(
+        self, *, generation_id: str, user_id: str
+    ) -> dict[int, tuple[str, list[dict]]]:
+        rows = await self.db.fetch_all(
+            """
+            SELECT chunk_index, key, cards FROM generation_chunks
+            WHERE generation_id = :generation_id AND user_id = :user_id
+            """,
+            values={"generation_id": generation_id, "user_id": user_id},
+        )
+        return {
+            row.chunk_index: (
+                row.key,
+                from_json(row.cards) if isinstance(row.cards, str) else row.cards,
+            )
+            for row in rows
+        }
+
+    async def save_checkpoint(
+        self,
+        *,
+        generation_id: str,
+        user_id: str,
+        chunk_index: int,
+        key: str,
+        cards: list[dict],
+    ) -> None:
+        await self.db.execute(
+            """
+            INSERT INTO generation_chunks
+                (generation_id, chunk_index, user_id, key, cards)
+            VALUES
+                (:generation_id, :chunk_index, :user_id, :key, CAST(:cards AS jsonb))
+            ON CONFLICT (generation_id, chunk_index) DO UPDATE
+            SET key = EXCLUDED.key, cards = EXCLUDED.cards, created_at = NOW()
+            WHERE generation_chunks.user_id = EXCLUDED.user_id
+            """,
+            values={
+                "generation_id": generation_id,
+                "chunk_index": chunk_index,
+                "user_id": user_id,
+                "key": key,
+                "cards": json.dumps(cards),
+            },
+        )
+
+    async def delete_checkpoints(self, *, generation_id: str, user_id: str) -> None:
+        await self.db.execute(
+            """
+            DELETE FROM generation_chunks
+            WHERE generation_id = :generation_id AND user_id = :user_id
+            """,
+            values={"generation_id": generation_id, "user_id": user_id},
+        )
+
+    async def delete_expired_checkpoints(self, *, ttl_seconds: int) -> None:
+        # Checkpoints of generations that failed a chunk and were never retried.
+        await self.db.execute(
+            """
+            DELETE FROM generation_chunks
+            WHERE created_at < NOW() - make_interval(secs => :ttl_seconds)
+            """,
+            values={"ttl_seconds": ttl_seconds},
+        )
@@ -0,0 +1,90 @@
+from typing import Callable
+from fastapi import HTTPException
+
+from app.core.config import settings
+
+
+class AdmissionRejected(HTTPException):
+    def __init__(self, *, retry_after: int):
+        super().__init__(
+            status_code=429,
+            detail=[{"msg": "Too many generation requests, try again later."}],
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+class RequestTooLarge(HTTPException):
+    def __init__(self):
+        super().__init__(
+            status_code=413,
+            detail=[{"msg": "Text is too long to generate cards from."}],
+        )
+
+
+class AdmissionTicket:
+    def __init__(self, on_release: Callable[[], None]) -> None:
+        self.__on_release = on_release
+        self.__released = False
+
+    def release(self) -> None:
+        if not self.__released:
+            self.__released = True
+            self.__on_release()
+
+    def __enter__(self) -> "AdmissionTicket":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.release()
+
+
+class AdmissionController:
+    """Caps the chunks and prompt tokens in flight, globally and per user.
+
+    Requests over the limit are rejected straight away with 429 and Retry-After
+    rather than being queued in front of the model server.
+    """
+
+    def __init__(self) -> None:
+        self.__chunks = 0
+        self.__tokens = 0
+        self.__user_chunks: dict[str, int] = {}
+        self.__user_tokens: dict[str, int] = {}
+
+    def check(self, *, user_id: str, chunks: int, tokens: int) -> None:
+        if (
+            chunks > settings.llm_max_user_inflight_chunks
+            or tokens > settings.llm_max_user_inflight_tokens
+        ):
+            raise RequestTooLarge
+        if (
+            self.__chunks + chunks > settings.llm_max_inflight_chunks
+            or self.__tokens + tokens > settings.llm_max_inflight_tokens
+            or self.__user_chunks.get(user_id, 0) + chunks
+            > settings.llm_max_user_inflight_chunks
+            or self.__user_tokens.get(user_id, 0) + tokens
+            > settings.llm_max_user_inflight_tokens
+        ):
+            raise AdmissionRejected(retry_after=settings.llm_retry_after_seconds)
+
+    def check_capacity(self, user_id: str) -> None:
+        # Even the smallest request takes a chunk and some tokens. When there is
+        # no room for one, reject before paying for preprocessing and tokenizing.
+        self.check(user_id=user_id, chunks=1, tokens=1)
+
+    def admit(self, *, user_id: str, chunks: int, tokens: int) -> AdmissionTicket:
+        self.check(user_id=user_id, chunks=chunks, tokens=tokens)
+        self.__add(user_id, chunks, tokens)
+        return AdmissionTicket(lambda: self.__add(user_id, -chunks, -tokens))
+
+    def __add(self, user_id: str, chunks: int, tokens: int) -> None:
+        self.__chunks += chunks
+        self.__tokens += tokens
+        user_chunks = self.__user_chunks.get(user_id, 0) + chunks
+        user_tokens = self.__user_tokens.get(user_id, 0) + tokens
+        if user_chunks or user_tokens:
+            self.__user_chunks[user_id] = user_chunks
+            self.__user_tokens[user_id] = user_tokens
+        else:
+            self.__user_chunks.pop(user_id, None)
+            self.__user_tokens.pop(user_id, None)
@@ -0,0 +1,144 @@
+from collections import Counter, defaultdict
+import re
+
+from app.models.llm import LMFlashCardResponse, LMQuizCardResponse
+
+Card = LMFlashCardResponse | LMQuizCardResponse
+
+# Terms shared by more kept cards than this are too common to find candidates,
+# they still count once a candidate is found through a rarer term.
+MAX_POSTINGS = 50
+
+# Symbols are terms too, "cos x" and "-cos x" are different answers.
+word = re.compile(r"\w+|[^\w\s.,;:!?'\"()]")
+# Question words and fillers that rewordings add or swap without changing the
+# fact asked about.
+stopwords = frozenset(
+    """
+    a an and are as at be by called can commonly did does do for from has have how
+    in into is it its known of on or referred that the their this to was were
+    what when where which who whom whose why with
+    """.split()
+)
+# Answers made only of these point at the options or just confirm the question,
+# so two cards sharing one can still be about different facts.
+generic = frozenset(
+    """
+    above all below both correct false following incorrect neither no none not
+    options these true yes
+    """.split()
+)
+
+
+def stem(term: str) -> str:
+    # Just enough to match "cell's" with "cell" and "cells".
+    term = term.removesuffix("'s").removesuffix("’s")
+    if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+        return term[:-1]
+    return term
+
+
+class Terms:
+    def __init__(self, question: frozenset[str], answer: frozenset[str]) -> None:
+        self.question = question
+        self.answer = answer
+
+    def __len__(self) -> int:
+        return len(self.question) + len(self.answer)
+
+
+def content_words(text: str) -> frozenset[str]:
+    words = word.findall(text.casefold().replace("’", "'"))
+    terms = frozenset(stem(w) for w in words if w not in stopwords)
+    # Text made only of stopwords still has to compare equal to itself.
+    return terms or frozenset(words)
+
+
+def card_terms(card: Card) -> Terms:
+    answer = (
+        card.answer
+        if isinstance(card, LMFlashCardResponse)
+        else card.answers[card.correctAnswer]
+    )
+    # A generic answer is left empty: it is no evidence either way.
+    return Terms(content_words(card.question), content_words(answer) - generic)
+
+
+def jaccard(a: frozenset[str], b: frozenset[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 0.0
+
+
+def similarity(a: Terms, b: Terms) -> float:
+    """Mean of the questions' and of the answers' Jaccard similarity.
+    Rewordings of a question share its key terms and keep the answer, while
+    different facts with the same answer differ in the question. When both
+    answers are generic ("All of the above", "True") only the questions count,
+    so cards differing in one key term stay apart."""
+    question = jaccard(a.question, b.question)
+    if not a.answer and not b.answer:
+        return question
+    return (question + jaccard(a.answer, b.answer)) / 2
+
+
+class Deduplicator:
+    """Greedy near-duplicate filter: a card is a duplicate when its similarity
+    to an earlier kept card reaches the threshold. Shared by the batch and the
+    streaming paths so both drop the same cards."""
+
+    def __init__(self, threshold: float) -> None:
+        self.threshold = threshold
+        self.kept: list[Terms] = []
+        self.postings: defaultdict[str, list[int]] = defaultdict(list)
+
+    def match(self, terms: Terms) -> int | None:
+        """Index of the kept card `terms` duplicates, if any. Candidates share
+        a question term: without one the score is at most 0.5."""
+        shared: Counter[int] = Counter()
+        common = 0
+        for term in terms.question:
+            if len(self.postings[term]) <= MAX_POSTINGS:
+                shared.update(self.postings[term])
+            else:
+                common += 1
+        # Even with equal answers the questions' Jaccard has to reach this, which
+        # rules out most candidates from the shared count alone. Common terms
+        # were not counted, so they are assumed shared.
+        min_question = 2 * self.threshold - 1
+        size = len(terms.question)
+        for i, n in sorted(shared.items()):
+            n += common
+            if n < min_question * (size + len(self.kept[i].question) - n):
+                continue
+            if similarity(terms, self.kept[i]) >= self.threshold:
+                return i
+        return None
+
+    def keep(self, terms: Terms) -> None:
+        for term in terms.question:
+            self.postings[term].append(len(self.kept))
+        self.kept.append(terms)
+
+    def is_duplicate(self, card: Card) -> bool:
+        terms = card_terms(card)
+        if self.match(terms) is not None:
+            return True
+        self.keep(terms)
+        return False
+
+
+def deduplicate(cards: list[Card], threshold: float) -> list[Card]:
+    """Drops the cards the streaming path would drop, but keeps the most
+    informative card of each group at the position of the group's first card,
+    since nothing was sent yet."""
+    dedup = Deduplicator(threshold)
+    kept: list[Card] = []
+    for card in cards:
+        terms = card_terms(card)
+        i = dedup.match(terms)
+        if i is None:
+            dedup.keep(terms)
+            kept.append(card)
+        elif len(terms) > len(card_terms(kept[i])):
+            # Matching still goes by the first card's terms, as when streaming.
+            kept[i] = card
+    return kept
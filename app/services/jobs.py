@@ -0,0 +1,112 @@
+import asyncio
+import logging
+from databases import Database
+from app.core.config import settings
+from app.models.job import GenerationJobModel
+from app.repositories.jobs import GenerationJobRepository
+from app.repositories.llm import LLMRepository
+from app.services.admission import AdmissionRejected
+from app.services.llm import LLMService
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class GenerationJobWorker:
+    def __init__(self, *, db: Database, llm: LLMService, concurrency: int) -> None:
+        self.llm = llm
+        self.concurrency = concurrency
+        self.job_repository = GenerationJobRepository(db)
+        self.llm_repository = LLMRepository(db)
+        self.__tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        logger.info(f"--- Starting {self.concurrency} generation job workers ---")
+        self.__tasks = [
+            asyncio.create_task(self.__run()) for _ in range(self.concurrency)
+        ]
+        self.__tasks.append(asyncio.create_task(self.__clean_up()))
+
+    async def stop(self) -> None:
+        for task in self.__tasks:
+            task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
+        self.__tasks = []
+
+    async def __run(self) -> None:
+        while True:
+            try:
+                job = await self.job_repository.claim_next_job(
+                    lease_seconds=settings.llm_job_lease_seconds
+                )
+            except Exception as e:
+                logger.error(e)
+                job = None
+            if job is None:
+                await asyncio.sleep(settings.llm_job_poll_interval)
+                continue
+            await self.__process(job)
+
+    async def __clean_up(self) -> None:
+        while True:
+            try:
+                await self.llm_repository.delete_expired_checkpoints(
+                    ttl_seconds=settings.llm_checkpoint_ttl_seconds
+                )
+                await self.llm_repository.delete_expired_chunks(
+                    ttl_seconds=settings.llm_cache_ttl_seconds
+                )
+            except Exception as e:
+                logger.warning(e)
+            await asyncio.sleep(settings.llm_cleanup_interval)
+
+    async def __heartbeat(self, job: GenerationJobModel) -> None:
+        while True:
+            await asyncio.sleep(settings.llm_job_lease_seconds / 3)
+            try:
+                await self.job_repository.renew_lease(
+                    job_id=job.id, lease_seconds=settings.llm_job_lease_seconds
+                )
+            except Exception as e:
+                logger.warning(e)
+
+    async def __process(self, job: GenerationJobModel) -> None:
+        logger.info(f"--- Processing generation job {job.id} ---")
+
+        async def on_progress(chunks_done: int, chunks_total: int) -> None:
+            await self.job_repository.update_progress(
+                job_id=job.id, chunks_done=chunks_done, chunks_total=chunks_total
+            )
+
+        heartbeat = asyncio.create_task(self.__heartbeat(job))
+        try:
+            result = await self.llm.generateFromText(
+                job.text,
+                job.type,
+                str(job.user_id),
+                self.llm_repository,
+                on_progress,
+                # A re-claimed job resumes from the chunks already checkpointed.
+                generation_id=str(job.id),
+            )
+            if result.failed_chunks:
+                logger.warning(
+                    f"--- Job {job.id}: {result.failed_chunks} chunks failed ---"
+                )
+            await self.job_repository.complete_job(job_id=job.id, cards=result.cards)
+        except asyncio.CancelledError:
+            # The worker is stopping, let another one pick the job up right away
+            # instead of after the lease runs out.
+            try:
+                await self.job_repository.release_job(job_id=job.id)
+            except Exception as e:
+                logger.warning(e)
+            raise
+        except AdmissionRejected as e:
+            # The queue is the backpressure for jobs: put it back and retry later.
+            await self.job_repository.release_job(job_id=job.id)
+            await asyncio.sleep(int(e.headers["Retry-After"]))
+        except Exception as e:
+            logger.error(e)
+            await self.job_repository.fail_job(job_id=job.id, error=str(e))
+        finally:
+            heartbeat.cancel()
@@ -1,19 +1,58 @@
+import asyncio
+from contextlib import aclosing, asynccontextmanager, contextmanager
 from datetime import datetime
-from transformers import AutoTokenizer
+import math
+import random
+import re
+import threading
+import time
+from typing import AsyncIterator, Awaitable, Callable, Iterator, TypeVar
 from string import Template
 from fastapi import HTTPException
-import requests
+from fastapi.concurrency import run_in_threadpool
+import httpx
 from pydantic_core import from_json
 import logging
+from app.core.config import settings
 from app.models.core import DeckType
 from app.models.llm import (
     LMFlashCardResponse,
     LMGenerationCardResponse,
+    LMGenerationResult,
     LMQuizCardResponse,
 )
+from app.repositories.llm import LLMRepository
+from app.services import metrics
+from app.services.admission import AdmissionController
+from app.services.dedup import Deduplicator, deduplicate
+from app.services.llm_backends import (
+    LLMBackend,
+    LLMBackendError,
+    LLMRouter,
+    NoBackendAvailable,
+    is_transient,
+)
+from app.services.llm_cache import LRUCache, chunk_cache_key
+from app.services.llm_output import (
+    NoUsableCards,
+    extract_items,
+    parse_card,
+    parse_cards,
+)
+from app.services.preprocessing import preprocess
+from app.services.scheduler import FairScheduler
+from app.services.single_flight import SingleFlight
 
 logger = logging.getLogger("uvicorn.error")
 
+ProgressCallback = Callable[[int, int], Awaitable[None]]
+CardsCallback = Callable[[list[LMGenerationCardResponse]], Awaitable[None]]
+
+T = TypeVar("T")
+
+
+# Bump whenever a prompt changes so cached generations are not reused.
+PROMPT_VERSION = 1
 
 flashcards_prompt = Template("""<start_of_turn>user
 You are a helpful assistant that generates open-ended flashcard-style questions based on an input text."
@@ -52,124 +91,895 @@ ${input}<end_of_turn>
 <start_of_turn>model""")
 
 
+# Sentence boundaries: terminal punctuation, optional closing quote or bracket.
+sentence_end = re.compile(r"(?:(?<=[.!?…])|(?<=[.!?…][\"'”’)\]]))\s+")
+
+
+class Segment:
+    def __init__(
+        self, text: str, tokens: int, paragraph: int = 0, exact: bool = True
+    ) -> None:
+        self.text = text
+        self.tokens = tokens
+        self.paragraph = paragraph
+        self.exact = exact
+
+
+class GenerationContext:
+    def __init__(
+        self,
+        *,
+        type: DeckType,
+        user_id: str,
+        repository: LLMRepository | None,
+        generation_id: str | None = None,
+    ) -> None:
+        self.type = type
+        self.user_id = user_id
+        self.repository = repository
+        self.generation_id = generation_id
+        self.checkpoints: dict[int, tuple[str, list[dict]]] = {}
+        self.chunks = 0
+        self.tokens_saved = 0
+        # Receives the index and the cards of every chunk once it is done, a
+        # failed chunk with no cards.
+        self.on_chunk: (
+            Callable[
+                [int, list[LMFlashCardResponse | LMQuizCardResponse]], Awaitable[None]
+            ]
+            | None
+        ) = None
+        self.semaphore = asyncio.Semaphore(settings.llm_max_concurrency)
+
+    @property
+    def checkpointed(self) -> bool:
+        # A single chunk has nothing to resume that the chunk cache would not.
+        return (
+            self.repository is not None
+            and self.generation_id is not None
+            and self.chunks > 1
+        )
+
+
 class LLMService:
     __model_name = "neuro-cards"
-    __url = "http://localhost:11434/api/chat"
+    __tokenizer_name = "unsloth/gemma-3-4b-it"
     __max_tokens = 4096
+    __options = {"seed": 2011}
 
     def __init__(self):
-        self.tokenizer = AutoTokenizer.from_pretrained("unsloth/gemma-3-4b-it")
-        self.__flashcards_prompt_len = len(
-            self.tokenizer.tokenize(flashcards_prompt.template)
+        self.__client: httpx.AsyncClient | None = None
+        self.__health_checks: asyncio.Task | None = None
+        self.router = LLMRouter(settings.ollama_urls)
+        self.__cache: LRUCache[str, list[dict]] = LRUCache(settings.llm_cache_size)
+        self.__flights: SingleFlight[
+            tuple[str, DeckType], list[LMFlashCardResponse | LMQuizCardResponse]
+        ] = SingleFlight()
+        self.scheduler = FairScheduler(settings.llm_global_concurrency)
+        self.admission = AdmissionController()
+        self.__tokenizer = None
+        self.__tokenizer_lock = threading.Lock()
+        self.__prompt_lens: dict[DeckType, int] = {}
+        metrics.registry.on_collect(self.__collect_metrics)
+
+    def __collect_metrics(self) -> None:
+        for backend in self.router.backends:
+            metrics.llm_backend_up.set(int(backend.healthy), backend=backend.url)
+            metrics.llm_backend_in_flight.set(backend.in_flight, backend=backend.url)
+        metrics.llm_scheduler_queued.set(self.scheduler.stats().queued)
+
+    @property
+    def tokenizer(self):
+        # transformers is heavy to import, so it is only loaded on first use or
+        # by warm_up() after startup, never when app.services is imported.
+        if self.__tokenizer is None:
+            with self.__tokenizer_lock:
+                if self.__tokenizer is None:
+                    from transformers import AutoTokenizer
+
+                    logger.info("--- Loading LLM tokenizer ---")
+                    self.__tokenizer = AutoTokenizer.from_pretrained(
+                        self.__tokenizer_name
+                    )
+                    logger.info("--- LLM tokenizer loaded ---")
+        return self.__tokenizer
+
+    @property
+    def is_ready(self) -> bool:
+        return self.__tokenizer is not None
+
+    def __warm_up(self) -> None:
+        for type in DeckType:
+            self.__total_tokens(0, type)
+
+    async def warm_up(self) -> None:
+        try:
+            await run_in_threadpool(self.__warm_up)
+        except Exception as e:
+            logger.error("--- LLM TOKENIZER ERROR ---")
+            logger.error(e)
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self.__client is None or self.__client.is_closed:
+            self.__client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    settings.llm_read_timeout, connect=settings.llm_connect_timeout
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.llm_max_connections,
+                    max_keepalive_connections=settings.llm_max_connections,
+                ),
+            )
+        return self.__client
+
+    async def start(self) -> None:
+        self.__health_checks = asyncio.create_task(
+            self.router.run_health_checks(
+                self.client, settings.llm_health_check_interval
+            )
         )
-        self.__quiz_prompt_len = len(self.tokenizer.tokenize(quiz_prompt.template))
 
-    def __count_tokens(self, text: str):
-        return len(self.tokenizer.tokenize(text))
+    async def close(self) -> None:
+        if self.__health_checks is not None:
+            self.__health_checks.cancel()
+            self.__health_checks = None
+        if self.__client is not None:
+            await self.__client.aclose()
+            self.__client = None
 
-    def __total_tokens(self, tokens: int, type: DeckType):
-        return (
-            tokens + self.__flashcards_prompt_len
-            if type == DeckType.Flashcards
-            else tokens + self.__quiz_prompt_len
+    def __count_tokens(self, text: str) -> int:
+        return self.__count_tokens_batch([text])[0]
+
+    def __count_tokens_batch(self, texts: list[str]) -> list[int]:
+        if not texts:
+            return []
+        encoded = self.tokenizer(
+            texts, add_special_tokens=False, return_attention_mask=False
         )
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def __estimate_tokens_batch(self, paragraphs: list[str]) -> list[int]:
+        # Calibrate characters per token on a prefix of the input itself, since
+        # the ratio depends heavily on the language of the document.
+        sample, sample_chars = [], 0
+        for p in paragraphs:
+            sample.append(p)
+            sample_chars += len(p)
+            if sample_chars >= settings.llm_token_calibration_chars:
+                break
+        sample_tokens = sum(self.__count_tokens_batch(sample))
+        chars_per_token = sample_chars / sample_tokens if sample_tokens else 1.0
+        return [math.ceil(len(p) / chars_per_token) for p in paragraphs]
+
+    def __total_tokens(self, tokens: int, type: DeckType):
+        if type not in self.__prompt_lens:
+            prompt = flashcards_prompt if type == DeckType.Flashcards else quiz_prompt
+            self.__prompt_lens[type] = self.__count_tokens(prompt.template)
+        return tokens + self.__prompt_lens[type]
 
-    def __chunk_text(self, text: str, type: DeckType) -> list[str]:
+    def __split_words(self, text: str, tokens: int, budget: int) -> list[Segment]:
+        words = text.split()
+        if tokens <= budget or len(words) < 2:
+            return [Segment(text, tokens)]
+        half = len(words) // 2
+        halves = [" ".join(words[:half]), " ".join(words[half:])]
+        return [
+            segment
+            for piece, count in zip(halves, self.__count_tokens_batch(halves))
+            for segment in self.__split_words(piece, count, budget)
+        ]
+
+    def __split_paragraph(self, paragraph: str, budget: int) -> list[Segment]:
+        sentences = [s for s in sentence_end.split(paragraph) if s]
+        segments = []
+        for sentence, tokens in zip(sentences, self.__count_tokens_batch(sentences)):
+            # A sentence that is too long on its own is cut between words.
+            segments.extend(self.__split_words(sentence, tokens, budget))
+        return segments
+
+    def __segment(self, paragraphs: list[str], budget: int) -> list[Segment]:
+        exact = settings.llm_token_counting == "exact"
+        if exact:
+            counts = self.__count_tokens_batch(paragraphs)
+            boundary = budget
+        else:
+            counts = self.__estimate_tokens_batch(paragraphs)
+            boundary = budget * (1 - settings.llm_token_estimate_margin)
+
+        segments = []
+        for i, (paragraph, tokens) in enumerate(zip(paragraphs, counts)):
+            is_exact = exact
+            if not exact and tokens > boundary:
+                tokens, is_exact = self.__count_tokens(paragraph), True
+            if tokens <= budget:
+                segments.append(Segment(paragraph, tokens, i, is_exact))
+                continue
+            for segment in self.__split_paragraph(paragraph, budget):
+                segment.paragraph = i
+                segments.append(segment)
+        return segments
+
+    def __join(self, segments: list[Segment]) -> str:
+        # Sentences of a split paragraph stay on one line, paragraphs do not.
+        text = segments[0].text
+        for prev, segment in zip(segments, segments[1:]):
+            sep = " " if segment.paragraph == prev.paragraph else "\n"
+            text += sep + segment.text
+        return text
+
+    def __overlap(self, segments: list[Segment], room: int) -> list[Segment]:
+        limit = min(settings.llm_chunk_overlap_tokens, room)
+        overlap, tokens = [], 0
+        for segment in reversed(segments):
+            if tokens + segment.tokens > limit:
+                break
+            overlap.insert(0, segment)
+            tokens += segment.tokens
+        return overlap
+
+    def __chunk_text(self, text: str, type: DeckType) -> tuple[list[str], int]:
         paragraphs = [p.strip() for p in text.split("\n") if p.strip()]
+        if not paragraphs:
+            return [], 0
+
+        # Input tokens per chunk, after the prompt and room for the response.
+        budget = (
+            self.__max_tokens
+            - settings.llm_response_tokens
+            - self.__total_tokens(0, type)
+        )
+        segments = self.__segment(paragraphs, budget)
+        boundary = (
+            budget
+            if settings.llm_token_counting == "exact"
+            else budget * (1 - settings.llm_token_estimate_margin)
+        )
 
         chunks = []
-        current_chunk = ""
+        current: list[Segment] = []
         current_tokens = 0
 
-        for paragraph in paragraphs:
-            paragraph_tokens = self.__count_tokens(paragraph)
-            if (
-                self.__total_tokens(current_tokens + paragraph_tokens, type)
-                > self.__max_tokens
-            ):
-                chunks.append(current_chunk.strip())
-                current_chunk = ""
-                current_tokens = 0
-            current_chunk += paragraph + "\n"
-            current_tokens += paragraph_tokens
-
-        if current_chunk:
-            chunks.append(current_chunk.strip())
-
-        return chunks
-
-    def __send_request(self, prompt: str) -> str:
-        logger.info("===starting request===")
-        payload = {
+        for segment in segments:
+            if current_tokens + segment.tokens > boundary:
+                # Estimates are only trusted far from the limit, recount exactly.
+                pending = [s for s in current + [segment] if not s.exact]
+                exact_counts = self.__count_tokens_batch([s.text for s in pending])
+                for s, tokens in zip(pending, exact_counts):
+                    s.tokens, s.exact = tokens, True
+                current_tokens = sum(s.tokens for s in current)
+            if current and current_tokens + segment.tokens > budget:
+                chunks.append(self.__join(current))
+                metrics.llm_chunk_tokens.observe(current_tokens, type=type.value)
+                current = self.__overlap(current, budget - segment.tokens)
+                current_tokens = sum(s.tokens for s in current)
+            current.append(segment)
+            current_tokens += segment.tokens
+
+        if current:
+            chunks.append(self.__join(current))
+            metrics.llm_chunk_tokens.observe(current_tokens, type=type.value)
+
+        return chunks, sum(s.tokens for s in segments)
+
+    def __build_payload(
+        self, prompt: str, stream: bool, options: dict | None = None
+    ) -> dict:
+        return {
             "model": self.__model_name,
             "messages": [{"role": "user", "content": prompt}],
-            "stream": False,
+            "stream": stream,
             "raw": True,
-            "options": {"seed": 2011},
+            "options": options or self.__options,
         }
-        response = requests.post(self.__url, json=payload)
-        if response.status_code != 200:
+
+    @asynccontextmanager
+    async def __backend_errors(self) -> AsyncIterator[None]:
+        try:
+            yield
+        except LLMBackendError as e:
             raise HTTPException(
-                status_code=400,
-                detail=[
-                    {
-                        "msg": "Error",
-                        "status": response.status_code,
-                        "err": response.text,
-                    }
-                ],
+                status_code=502 if is_transient(e) else 400,
+                detail=[{"msg": "Error", "status": e.status_code, "err": e.text}],
             )
-        res = response.json()
-        logger.info(res)
+        except NoBackendAvailable:
+            raise HTTPException(
+                status_code=503, detail=[{"msg": "No model server available"}]
+            )
+        except httpx.TimeoutException:
+            raise HTTPException(
+                status_code=504, detail=[{"msg": "Model server timed out"}]
+            )
+        except httpx.TransportError:
+            raise HTTPException(
+                status_code=502, detail=[{"msg": "Model server unreachable"}]
+            )
+
+    async def __backoff(self, attempt: int, e: Exception) -> bool:
+        if attempt >= settings.llm_max_retries or not is_transient(e):
+            return False
+        # Full jitter, so chunks that failed together do not retry together.
+        delay = random.uniform(0, settings.llm_retry_backoff * 2**attempt)
+        logger.warning(f"LLM call failed ({e!r}), retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+        return True
+
+    async def __with_retries(self, call: Callable[[], Awaitable[T]]) -> T:
+        attempt = 0
+        while True:
+            try:
+                return await call()
+            except (LLMBackendError, httpx.TransportError) as e:
+                if not await self.__backoff(attempt, e):
+                    raise
+            attempt += 1
+
+    @contextmanager
+    def __count_errors(self, type: DeckType, backend: LLMBackend) -> Iterator[None]:
+        try:
+            yield
+        except Exception:
+            metrics.llm_requests.inc(
+                type=type.value, backend=backend.url, status="error"
+            )
+            raise
+
+    def __observe(
+        self,
+        res: dict,
+        type: DeckType,
+        backend: LLMBackend,
+        ttft: float | None = None,
+    ) -> None:
+        metrics.observe_response(res, type=type.value, backend=backend.url, ttft=ttft)
+        logger.info(
+            f"===finished request on {backend.url}: "
+            f"{res.get('prompt_eval_count', 0)} prompt tokens, "
+            f"{res.get('eval_count', 0)} generated tokens==="
+        )
+
+    async def __chat(self, payload: dict, type: DeckType) -> str:
+        async with self.router.acquire() as backend:
+            logger.info(f"===starting request on {backend.url}===")
+            with self.__count_errors(type, backend):
+                res = await backend.chat(self.client, payload)
+        self.__observe(res, type, backend)
         return res["message"]["content"]
 
-    def __generate_from_text(
-        self, text: str, type: DeckType
-    ) -> list[LMFlashCardResponse]:
-        chunks = self.__chunk_text(text, type)
-        result = []
-        for c in chunks:
-            formatted_prompt = (
-                flashcards_prompt.substitute(input=c)
-                if type == DeckType.Flashcards
-                else quiz_prompt.substitute(input=c)
+    async def __send_request(
+        self, prompt: str, type: DeckType, options: dict | None = None
+    ) -> str:
+        payload = self.__build_payload(prompt, stream=False, options=options)
+        async with self.__backend_errors():
+            return await self.__with_retries(lambda: self.__chat(payload, type))
+
+    async def __stream_request(self, prompt: str, type: DeckType) -> AsyncIterator[str]:
+        payload = self.__build_payload(prompt, stream=True)
+        attempt = 0
+        async with self.__backend_errors():
+            while True:
+                started = False
+                try:
+                    async with self.router.acquire() as backend:
+                        logger.info(f"===starting stream request on {backend.url}===")
+                        with self.__count_errors(type, backend):
+                            sent, ttft = time.monotonic(), None
+                            responses = backend.stream(self.client, payload)
+                            async with aclosing(responses):
+                                async for res in responses:
+                                    content = res["message"]["content"]
+                                    if ttft is None and content:
+                                        ttft = time.monotonic() - sent
+                                    started = True
+                                    yield content
+                                    if res.get("done"):
+                                        self.__observe(res, type, backend, ttft)
+                                        break
+                    return
+                except (LLMBackendError, httpx.TransportError) as e:
+                    # Once output has been emitted a retry would duplicate it.
+                    if started or not await self.__backoff(attempt, e):
+                        raise
+                attempt += 1
+
+    def __build_prompt(self, chunk: str, type: DeckType) -> str:
+        return (
+            flashcards_prompt.substitute(input=chunk)
+            if type == DeckType.Flashcards
+            else quiz_prompt.substitute(input=chunk)
+        )
+
+    def __card_model(
+        self, type: DeckType
+    ) -> type[LMFlashCardResponse] | type[LMQuizCardResponse]:
+        return (
+            LMFlashCardResponse if type == DeckType.Flashcards else LMQuizCardResponse
+        )
+
+    def __cache_key(self, chunk: str, type: DeckType) -> str:
+        return chunk_cache_key(
+            chunk=chunk,
+            type=type,
+            prompt_version=PROMPT_VERSION,
+            model=self.__model_name,
+            options=self.__options,
+        )
+
+    async def __get_cached(
+        self, key: str, context: GenerationContext
+    ) -> list[LMFlashCardResponse | LMQuizCardResponse] | None:
+        cards = self.__cache.get(key)
+        if cards is None and context.repository is not None:
+            try:
+                cards = await context.repository.get_cached_chunk(
+                    key=key, ttl_seconds=settings.llm_cache_ttl_seconds
+                )
+            except Exception as e:
+                logger.warning(e)
+            if cards is not None:
+                self.__cache.set(key, cards)
+        if cards is None:
+            return None
+        model = self.__card_model(context.type)
+        return [model.model_validate(c) for c in cards]
+
+    async def __set_cached(
+        self,
+        key: str,
+        cards: list[LMFlashCardResponse | LMQuizCardResponse],
+        context: GenerationContext,
+    ) -> None:
+        dumped = [c.model_dump() for c in cards]
+        self.__cache.set(key, dumped)
+        if context.repository is not None:
+            try:
+                await context.repository.cache_chunk(
+                    key=key, type=context.type, cards=dumped
+                )
+            except Exception as e:
+                logger.warning(e)
+
+    def __flight_key(self, chunk: str, type: DeckType) -> tuple[str, DeckType]:
+        return " ".join(chunk.split()), type
+
+    @asynccontextmanager
+    async def __slot(self, context: GenerationContext) -> AsyncIterator[None]:
+        # The per-request semaphore is taken first so one request never holds
+        # more than llm_max_concurrency places in the shared scheduler queue.
+        queued = time.monotonic()
+        async with context.semaphore, self.scheduler.slot(context.user_id):
+            metrics.llm_queue_wait.observe(
+                time.monotonic() - queued, type=context.type.value
+            )
+            yield
+
+    async def __generate_chunk(
+        self, chunk: str, context: GenerationContext
+    ) -> list[LMFlashCardResponse | LMQuizCardResponse]:
+        return await self.__flights.do(
+            self.__flight_key(chunk, context.type),
+            lambda: self.__generate_chunk_uncoalesced(chunk, context),
+        )
+
+    async def __generate_chunk_uncoalesced(
+        self, chunk: str, context: GenerationContext
+    ) -> list[LMFlashCardResponse | LMQuizCardResponse]:
+        key = self.__cache_key(chunk, context.type)
+        cached = await self.__get_cached(key, context)
+        if cached is not None:
+            return cached
+
+        prompt = self.__build_prompt(chunk, context.type)
+        async with self.__slot(context):
+            async with asyncio.timeout(settings.llm_chunk_timeout):
+                content = await self.__send_request(prompt, context.type)
+        cards = parse_cards(content, context.type)
+        if not cards:
+            cards = await self.__reask(prompt, context)
+        await self.__set_cached(key, cards, context)
+        return cards
+
+    async def __reask(
+        self, prompt: str, context: GenerationContext
+    ) -> list[LMFlashCardResponse | LMQuizCardResponse]:
+        # The seed is fixed, so asking again only helps with a different one.
+        logger.warning("No usable cards in model output, asking again")
+        options = {**self.__options, "seed": self.__options["seed"] + 1}
+        async with self.__slot(context):
+            async with asyncio.timeout(settings.llm_chunk_timeout):
+                content = await self.__send_request(prompt, context.type, options)
+        cards = parse_cards(content, context.type)
+        if not cards:
+            raise NoUsableCards()
+        return cards
+
+    async def __stream_chunk(
+        self, chunk: str, context: GenerationContext, queue: asyncio.Queue
+    ) -> list[LMFlashCardResponse | LMQuizCardResponse]:
+        flight_key = self.__flight_key(chunk, context.type)
+        if flight_key in self.__flights:
+            # An identical chunk is already being generated, wait for it instead.
+            cards = await self.__generate_chunk(chunk, context)
+            for card in cards:
+                await queue.put(card)
+            return cards
+        # Registered as a flight too, so identical chunks arriving meanwhile
+        # wait for this stream instead of running the model again.
+        return await self.__flights.do(
+            flight_key,
+            lambda: self.__stream_chunk_uncoalesced(chunk, context, queue),
+        )
+
+    async def __stream_chunk_uncoalesced(
+        self, chunk: str, context: GenerationContext, queue: asyncio.Queue
+    ) -> list[LMFlashCardResponse | LMQuizCardResponse]:
+        key = self.__cache_key(chunk, context.type)
+        cached = await self.__get_cached(key, context)
+        if cached is not None:
+            for card in cached:
+                await queue.put(card)
+            return cached
+
+        content = ""
+        cards: list[LMFlashCardResponse | LMQuizCardResponse | None] = []
+
+        async def emit(items: list) -> None:
+            for item in items[len(cards) :]:
+                # Invalid elements keep their position so they are not re-parsed.
+                card = parse_card(item, context.type)
+                cards.append(card)
+                if card is not None:
+                    await queue.put(card)
+
+        prompt = self.__build_prompt(chunk, context.type)
+        pieces = self.__stream_request(prompt, context.type)
+        async with self.__slot(context), aclosing(pieces):
+            async with asyncio.timeout(settings.llm_chunk_timeout):
+                async for piece in pieces:
+                    content += piece
+                    start = content.find("[")
+                    if start == -1:
+                        continue
+                    try:
+                        items = from_json(content[start:], allow_partial=True)
+                    except ValueError:
+                        continue
+                    # Every element but the last one is closed, so emit them.
+                    await emit(items[:-1])
+
+        items = extract_items(content)
+        if len(items) >= len(cards):
+            await emit(items)
+        valid = [c for c in cards if c is not None]
+        if not valid:
+            valid = await self.__reask(prompt, context)
+            for card in valid:
+                await queue.put(card)
+        await self.__set_cached(key, valid, context)
+        return valid
+
+    async def __load_checkpoints(self, context: GenerationContext) -> None:
+        if not context.checkpointed:
+            return
+        try:
+            context.checkpoints = await context.repository.get_checkpoints(
+                generation_id=context.generation_id, user_id=context.user_id
             )
-            json_data = self.__send_request(formatted_prompt)
-            json_data = json_data[json_data.index("[") : json_data.rindex("]") + 1]
-            model = (
-                LMFlashCardResponse
-                if type == DeckType.Flashcards
-                else LMQuizCardResponse
+        except Exception as e:
+            logger.warning(e)
+
+    def __restore_checkpoint(
+        self, i: int, chunk: str, context: GenerationContext
+    ) -> list[LMFlashCardResponse | LMQuizCardResponse] | None:
+        saved = context.checkpoints.get(i)
+        # The key guards against resuming with a different text under the same id.
+        if saved is None or saved[0] != self.__cache_key(chunk, context.type):
+            return None
+        model = self.__card_model(context.type)
+        return [model.model_validate(c) for c in saved[1]]
+
+    async def __save_checkpoint(
+        self,
+        i: int,
+        chunk: str,
+        cards: list[LMFlashCardResponse | LMQuizCardResponse],
+        context: GenerationContext,
+    ) -> None:
+        if not context.checkpointed:
+            return
+        try:
+            await context.repository.save_checkpoint(
+                generation_id=context.generation_id,
+                user_id=context.user_id,
+                chunk_index=i,
+                key=self.__cache_key(chunk, context.type),
+                cards=[c.model_dump() for c in cards],
             )
-            cards = [
-                model.model_validate(c)
-                for c in from_json(json_data, allow_partial=True)
-            ]
-            result.extend(cards)
-        return result
+        except Exception as e:
+            logger.warning(e)
 
-    def generateCardsFromText(self, text: str) -> list[LMGenerationCardResponse]:
-        cards = self.__generate_from_text(text, DeckType.Flashcards)
-        return [
-            LMGenerationCardResponse(
-                question=cards[i].question,
-                options=[cards[i].answer],
+    async def __clear_checkpoints(self, context: GenerationContext) -> None:
+        # Once every chunk succeeded the chunk cache is enough for a repeat.
+        if not context.checkpointed:
+            return
+        try:
+            await context.repository.delete_checkpoints(
+                generation_id=context.generation_id, user_id=context.user_id
+            )
+        except Exception as e:
+            logger.warning(e)
+
+    def __split_text(
+        self, text: str, context: GenerationContext
+    ) -> tuple[list[str], int]:
+        if not settings.llm_preprocess:
+            return self.__chunk_text(text, context.type)
+        cleaned = preprocess(text)
+        chunks, tokens = self.__chunk_text(cleaned.text, context.type)
+        # Extrapolated from the removed characters, the raw text is never counted.
+        if cleaned.chars_after:
+            ratio = cleaned.chars_before / cleaned.chars_after
+            context.tokens_saved = max(round(tokens * (ratio - 1)), 0)
+        logger.info(
+            f"Preprocessing removed {cleaned.removed_lines} lines and "
+            f"{cleaned.removed_paragraphs} paragraphs, "
+            f"~{context.tokens_saved} tokens saved"
+        )
+        return chunks, tokens
+
+    async def __prepare(
+        self, text: str, context: GenerationContext
+    ) -> tuple[list[str], dict]:
+        chunks, tokens = await run_in_threadpool(self.__split_text, text, context)
+        metrics.llm_chunks_per_request.observe(len(chunks), type=context.type.value)
+        prompt_tokens = self.__total_tokens(0, context.type) * len(chunks)
+        demand = {
+            "user_id": context.user_id,
+            "chunks": len(chunks),
+            "tokens": tokens + prompt_tokens,
+        }
+        return chunks, demand
+
+    async def __generate_from_text(
+        self,
+        text: str,
+        context: GenerationContext,
+        on_progress: ProgressCallback | None = None,
+    ) -> tuple[list[LMFlashCardResponse | LMQuizCardResponse], int]:
+        self.admission.check_capacity(context.user_id)
+        chunks, demand = await self.__prepare(text, context)
+        with self.admission.admit(**demand):
+            return await self.__generate_chunks(chunks, context, on_progress)
+
+    def __chunk_failed(self, e: Exception, i: int) -> Exception:
+        logger.error(f"Chunk {i} failed: {e!r}")
+        if isinstance(e, TimeoutError):
+            return HTTPException(
+                status_code=504, detail=[{"msg": "Model server timed out"}]
+            )
+        return e
+
+    async def __generate_chunks(
+        self,
+        chunks: list[str],
+        context: GenerationContext,
+        on_progress: ProgressCallback | None,
+    ) -> tuple[list[LMFlashCardResponse | LMQuizCardResponse], int]:
+        chunks_done = 0
+        errors: list[Exception] = []
+
+        async def generate(i: int, chunk: str) -> list:
+            nonlocal chunks_done
+            # One flaky chunk must not throw away the cards of all the others.
+            try:
+                cards = self.__restore_checkpoint(i, chunk, context)
+                if cards is None:
+                    cards = await self.__generate_chunk(chunk, context)
+                    await self.__save_checkpoint(i, chunk, cards, context)
+            except Exception as e:
+                errors.append(self.__chunk_failed(e, i))
+                cards = []
+            if context.on_chunk is not None:
+                try:
+                    await context.on_chunk(i, cards)
+                except Exception as e:
+                    errors.append(self.__chunk_failed(e, i))
+                    cards = []
+            chunks_done += 1
+            if on_progress is not None:
+                await on_progress(chunks_done, len(chunks))
+            return cards
+
+        context.chunks = len(chunks)
+        await self.__load_checkpoints(context)
+        if on_progress is not None:
+            await on_progress(0, len(chunks))
+        async with asyncio.TaskGroup() as tg:
+            tasks = [tg.create_task(generate(i, c)) for i, c in enumerate(chunks)]
+        if errors and len(errors) == len(chunks):
+            raise errors[0]
+        if not errors:
+            await self.__clear_checkpoints(context)
+        return [card for task in tasks for card in task.result()], len(errors)
+
+    def __to_generation_card(
+        self, card: LMFlashCardResponse | LMQuizCardResponse, i: int
+    ) -> LMGenerationCardResponse:
+        temp_id = round(datetime.now().timestamp() * (i + 0.5) * 1000)
+        if isinstance(card, LMFlashCardResponse):
+            return LMGenerationCardResponse(
+                question=card.question,
+                options=[card.answer],
                 correctAnswer=0,
                 difficulty=0,
-                tempId=round(datetime.now().timestamp() * (i + 0.5) * 1000),
+                tempId=temp_id,
             )
-            for i in range(len(cards))
-        ]
+        return LMGenerationCardResponse(
+            question=card.question,
+            options=card.answers,
+            correctAnswer=card.correctAnswer,
+            difficulty=card.difficulty,
+            tempId=temp_id,
+        )
 
-    def generateQuizFromText(self, text: str) -> list[str]:
-        cards = self.__generate_from_text(text, DeckType.Quiz)
-        return [
-            LMGenerationCardResponse(
-                question=cards[i].question,
-                options=cards[i].answers,
-                correctAnswer=cards[i].correctAnswer,
-                difficulty=cards[i].difficulty,
-                tempId=round(datetime.now().timestamp() * (i + 0.5) * 1000),
+    async def generateFromText(
+        self,
+        text: str,
+        type: DeckType,
+        user_id: str,
+        repository: LLMRepository | None = None,
+        on_progress: ProgressCallback | None = None,
+        generation_id: str | None = None,
+        on_cards: CardsCallback | None = None,
+    ) -> LMGenerationResult:
+        context = GenerationContext(
+            type=type,
+            user_id=user_id,
+            repository=repository,
+            generation_id=generation_id,
+        )
+        kept: list[LMFlashCardResponse | LMQuizCardResponse] = []
+        if on_cards is not None:
+            # Cards are handed over chunk by chunk, so duplicates have to be
+            # dropped incrementally against what was already handed over.
+            dedup = (
+                Deduplicator(settings.llm_dedup_threshold)
+                if settings.llm_dedup
+                else None
             )
-            for i in range(len(cards))
-        ]
+            # Chunks finish in any order, but are handed over in document order
+            # so the same text always gives the same deck.
+            finished: dict[int, list] = {}
+            handed_over = 0
+            lock = asyncio.Lock()
+
+            async def hand_over(cards: list) -> None:
+                fresh = [c for c in cards if dedup is None or not dedup.is_duplicate(c)]
+                if fresh:
+                    await on_cards(
+                        [
+                            self.__to_generation_card(card, len(kept) + i)
+                            for i, card in enumerate(fresh)
+                        ]
+                    )
+                    kept.extend(fresh)
+
+            async def on_chunk(i: int, cards: list) -> None:
+                nonlocal handed_over
+                finished[i] = cards
+                failure: Exception | None = None
+                async with lock:
+                    while handed_over in finished:
+                        cards = finished.pop(handed_over)
+                        handed_over += 1
+                        # Later chunks may wait on this call, so keep going.
+                        try:
+                            await hand_over(cards)
+                        except Exception as e:
+                            failure = failure or e
+                if failure is not None:
+                    raise failure
+
+            context.on_chunk = on_chunk
+
+        cards, failed = await self.__generate_from_text(text, context, on_progress)
+        generated = len(cards)
+        if on_cards is not None:
+            cards = kept
+        elif settings.llm_dedup:
+            # Chunks are generated independently and often repeat the same fact.
+            cards = await run_in_threadpool(
+                deduplicate, cards, settings.llm_dedup_threshold
+            )
+        return LMGenerationResult(
+            cards=[self.__to_generation_card(card, i) for i, card in enumerate(cards)],
+            failed_chunks=failed,
+            tokens_saved=context.tokens_saved,
+            duplicates_removed=generated - len(cards),
+        )
+
+    async def generateCardsFromText(
+        self, text: str, user_id: str, repository: LLMRepository | None = None
+    ) -> LMGenerationResult:
+        return await self.generateFromText(
+            text, DeckType.Flashcards, user_id, repository
+        )
+
+    async def generateQuizFromText(
+        self, text: str, user_id: str, repository: LLMRepository | None = None
+    ) -> LMGenerationResult:
+        return await self.generateFromText(text, DeckType.Quiz, user_id, repository)
+
+    async def streamFromText(
+        self,
+        text: str,
+        type: DeckType,
+        user_id: str,
+        repository: LLMRepository | None = None,
+        generation_id: str | None = None,
+    ) -> AsyncIterator[LMGenerationCardResponse]:
+        # Admission is checked before the response starts so that a rejection can
+        # still be sent as a 429; the capacity itself is taken once streaming does.
+        context = GenerationContext(
+            type=type,
+            user_id=user_id,
+            repository=repository,
+            generation_id=generation_id,
+        )
+        self.admission.check_capacity(user_id)
+        chunks, demand = await self.__prepare(text, context)
+        self.admission.check(**demand)
+        return self.__stream_chunks(chunks, context, demand)
+
+    async def __stream_chunks(
+        self, chunks: list[str], context: GenerationContext, demand: dict
+    ) -> AsyncIterator[LMGenerationCardResponse]:
+        ticket = self.admission.admit(**demand)
+        context.chunks = len(chunks)
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        errors: list[Exception] = []
+
+        async def stream_chunk(i: int, chunk: str) -> None:
+            try:
+                cards = self.__restore_checkpoint(i, chunk, context)
+                if cards is not None:
+                    for card in cards:
+                        await queue.put(card)
+                    return
+                cards = await self.__stream_chunk(chunk, context, queue)
+                await self.__save_checkpoint(i, chunk, cards, context)
+            except Exception as e:
+                errors.append(self.__chunk_failed(e, i))
+
+        async def produce() -> None:
+            try:
+                await self.__load_checkpoints(context)
+                async with asyncio.TaskGroup() as tg:
+                    for i, c in enumerate(chunks):
+                        tg.create_task(stream_chunk(i, c))
+            finally:
+                await queue.put(done)
+
+        dedup = (
+            Deduplicator(settings.llm_dedup_threshold)
+            if settings.llm_dedup
+            else None
+        )
+        producer = asyncio.create_task(produce())
+        try:
+            i = 0
+            while (card := await queue.get()) is not done:
+                if dedup is not None and dedup.is_duplicate(card):
+                    continue
+                yield self.__to_generation_card(card, i)
+                i += 1
+            await producer
+            if errors and len(errors) == len(chunks):
+                raise errors[0]
+            if not errors:
+                await self.__clear_checkpoints(context)
+        finally:
+            producer.cancel()
+            ticket.release()
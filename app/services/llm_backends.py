@@ -0,0 +1,280 @@
+from abc import ABC, abstractmethod
+import asyncio
+from contextlib import asynccontextmanager
+import json
+import logging
+import time
+from typing import AsyncIterator
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+from pydantic_core import from_json
+
+from app.core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class LLMBackendError(Exception):
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"LLM backend returned {status_code}: {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+class NoBackendAvailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Closed: calls flow. Open: calls fail fast until `reset_timeout` passes.
+    Half-open: a single trial call decides whether to close or open again."""
+
+    Closed = "closed"
+    Open = "open"
+    HalfOpen = "half-open"
+
+    def __init__(self, *, max_failures: int, reset_timeout: float) -> None:
+        self.max_failures = max_failures
+        self.reset_timeout = reset_timeout
+        self.state = self.Closed
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+
+    @property
+    def available(self) -> bool:
+        if self.state == self.Closed:
+            return True
+        return (
+            self.state == self.Open
+            and time.monotonic() - self.opened_at >= self.reset_timeout
+        )
+
+    def on_dispatch(self) -> None:
+        if self.state == self.Open:
+            self.state = self.HalfOpen
+
+    def on_abandoned(self) -> None:
+        # A trial call that was cancelled proves nothing, allow another one.
+        if self.state == self.HalfOpen:
+            self.state = self.Open
+
+    def close(self) -> None:
+        self.state = self.Closed
+        self.consecutive_failures = 0
+
+    def trip(self) -> None:
+        self.state = self.Open
+        self.opened_at = time.monotonic()
+
+    def on_success(self) -> None:
+        self.close()
+
+    def on_failure(self) -> None:
+        self.consecutive_failures += 1
+        if (
+            self.state == self.HalfOpen
+            or self.consecutive_failures >= self.max_failures
+        ):
+            self.trip()
+
+
+class LLMBackend(ABC):
+    """One model server. Keeps the bookkeeping the router balances on."""
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.breaker = CircuitBreaker(
+            max_failures=settings.llm_backend_max_failures,
+            reset_timeout=settings.llm_breaker_reset_seconds,
+        )
+        self.in_flight = 0
+        self.latency_ewma: float | None = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.breaker.state == CircuitBreaker.Closed
+
+    @abstractmethod
+    async def chat(self, client: httpx.AsyncClient, payload: dict) -> dict: ...
+
+    @abstractmethod
+    def stream(
+        self, client: httpx.AsyncClient, payload: dict
+    ) -> AsyncIterator[dict]: ...
+
+    @abstractmethod
+    async def probe(self, client: httpx.AsyncClient) -> bool: ...
+
+    def record_success(self, latency: float) -> None:
+        if not self.healthy:
+            logger.info(f"--- LLM backend {self.url} is back ---")
+        self.breaker.on_success()
+        self.latency_ewma = (
+            latency
+            if self.latency_ewma is None
+            else 0.8 * self.latency_ewma + 0.2 * latency
+        )
+
+    def record_failure(self) -> None:
+        was_healthy = self.healthy
+        self.breaker.on_failure()
+        if was_healthy and not self.healthy:
+            logger.warning(f"--- Ejecting LLM backend {self.url} ---")
+
+
+class OllamaBackend(LLMBackend):
+    async def chat(self, client: httpx.AsyncClient, payload: dict) -> dict:
+        response = await client.post(f"{self.url}/api/chat", json=payload)
+        if response.status_code != 200:
+            raise LLMBackendError(response.status_code, response.text)
+        return response.json()
+
+    async def stream(
+        self, client: httpx.AsyncClient, payload: dict
+    ) -> AsyncIterator[dict]:
+        async with client.stream(
+            "POST", f"{self.url}/api/chat", json=payload
+        ) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise LLMBackendError(response.status_code, response.text)
+            async for line in response.aiter_lines():
+                if line:
+                    yield from_json(line)
+
+    async def probe(self, client: httpx.AsyncClient) -> bool:
+        response = await client.get(f"{self.url}/api/version")
+        return response.status_code == 200
+
+
+class FakeBackend(LLMBackend):
+    """In-process stand-in for Ollama, selected with a `fake://` url.
+
+    Answers with one well-formed card per input paragraph, optionally after
+    `fake://?latency=<seconds>`, so generation can be exercised without a GPU.
+    """
+
+    def __init__(self, url: str) -> None:
+        super().__init__(url)
+        query = parse_qs(urlsplit(url).query)
+        self.latency = float(query.get("latency", ["0"])[0])
+
+    def __content(self, payload: dict) -> str:
+        prompt = payload["messages"][-1]["content"]
+        text = prompt.rsplit("Input:\n", 1)[-1].split("<end_of_turn>", 1)[0]
+        quiz = '"answers"' in prompt
+        cards = []
+        for paragraph in [p.strip() for p in text.split("\n") if p.strip()]:
+            question = f"What is said about: {paragraph[:64]}?"
+            if quiz:
+                cards.append(
+                    {
+                        "question": question,
+                        "answers": [paragraph[:128], "Option B", "Option C", "None"],
+                        "correctAnswer": 0,
+                        "difficulty": 1,
+                    }
+                )
+            else:
+                cards.append({"question": question, "answer": paragraph})
+        return json.dumps(cards, ensure_ascii=False, indent=2)
+
+    def __response(self, content: str, done: bool) -> dict:
+        return {"message": {"role": "assistant", "content": content}, "done": done}
+
+    async def chat(self, client: httpx.AsyncClient, payload: dict) -> dict:
+        await asyncio.sleep(self.latency)
+        return self.__response(self.__content(payload), done=True)
+
+    async def stream(
+        self, client: httpx.AsyncClient, payload: dict
+    ) -> AsyncIterator[dict]:
+        content = self.__content(payload)
+        pieces = [content[i : i + 16] for i in range(0, len(content), 16)]
+        for piece in pieces:
+            await asyncio.sleep(self.latency / max(len(pieces), 1))
+            yield self.__response(piece, done=False)
+        yield self.__response("", done=True)
+
+    async def probe(self, client: httpx.AsyncClient) -> bool:
+        return True
+
+
+def create_backend(url: str) -> LLMBackend:
+    if url.startswith("fake://"):
+        return FakeBackend(url)
+    return OllamaBackend(url.rstrip("/"))
+
+
+def is_transient(e: Exception) -> bool:
+    if isinstance(e, LLMBackendError):
+        return e.status_code == 429 or e.status_code >= 500
+    return isinstance(e, httpx.TransportError)
+
+
+class LLMRouter:
+    """Sends each call to the healthy backend with the fewest requests in flight.
+
+    Every backend sits behind a circuit breaker: after repeated transient
+    failures it is ejected, and calls fail fast with NoBackendAvailable once no
+    backend is left, instead of piling up behind a dead model server.
+    """
+
+    def __init__(self, urls: list[str]) -> None:
+        self.backends = [create_backend(url) for url in urls]
+
+    def pick(self) -> LLMBackend:
+        available = [b for b in self.backends if b.breaker.available]
+        if not available:
+            raise NoBackendAvailable("No healthy LLM backend available")
+        # Closed backends first, a half-open trial only when nothing else is left.
+        return min(
+            available, key=lambda b: (not b.healthy, b.in_flight, b.latency_ewma or 0)
+        )
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[LLMBackend]:
+        backend = self.pick()
+        backend.breaker.on_dispatch()
+        backend.in_flight += 1
+        started = time.monotonic()
+        try:
+            yield backend
+        except Exception as e:
+            if is_transient(e):
+                backend.record_failure()
+            else:
+                backend.breaker.on_abandoned()
+            raise
+        except BaseException:
+            backend.breaker.on_abandoned()
+            raise
+        else:
+            backend.record_success(time.monotonic() - started)
+        finally:
+            backend.in_flight -= 1
+
+    async def probe(self, client: httpx.AsyncClient) -> None:
+        async def probe_backend(backend: LLMBackend) -> None:
+            try:
+                healthy = await backend.probe(client)
+            except httpx.HTTPError:
+                healthy = False
+            # A probe can only open a breaker, or keep it open for another
+            # reset period. Answering /api/version says nothing about /api/chat,
+            # so closing one is left to a successful half-open trial call.
+            if healthy or backend.breaker.state == CircuitBreaker.HalfOpen:
+                return
+            if backend.healthy:
+                logger.warning(f"--- LLM backend {backend.url} failed probe ---")
+            backend.breaker.trip()
+
+        await asyncio.gather(*(probe_backend(b) for b in self.backends))
+
+    async def run_health_checks(
+        self, client: httpx.AsyncClient, interval: float
+    ) -> None:
+        while True:
+            await self.probe(client)
+            await asyncio.sleep(interval)
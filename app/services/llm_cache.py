@@ -0,0 +1,44 @@
+from collections import OrderedDict
+import hashlib
+import json
+from typing import Generic, TypeVar
+
+from app.models.core import DeckType
+
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.__data: OrderedDict[K, V] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        if key not in self.__data:
+            return None
+        self.__data.move_to_end(key)
+        return self.__data[key]
+
+    def set(self, key: K, value: V) -> None:
+        if self.maxsize <= 0:
+            return
+        self.__data[key] = value
+        self.__data.move_to_end(key)
+        while len(self.__data) > self.maxsize:
+            self.__data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.__data)
+
+
+def chunk_cache_key(
+    *, chunk: str, type: DeckType, prompt_version: int, model: str, options: dict
+) -> str:
+    material = json.dumps(
+        [prompt_version, type.value, model, options, chunk],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
@@ -0,0 +1,162 @@
+import logging
+from typing import Iterator
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from pydantic_core import from_json
+
+from app.models.core import DeckType
+from app.models.llm import LMFlashCardResponse, LMQuizCardResponse
+
+logger = logging.getLogger("uvicorn.error")
+
+QUIZ_ANSWERS = 4
+MAX_DIFFICULTY = 2
+DEFAULT_DIFFICULTY = 1
+
+
+class NoUsableCards(HTTPException):
+    def __init__(self) -> None:
+        super().__init__(
+            status_code=502, detail=[{"msg": "Model returned no usable cards"}]
+        )
+
+
+def extract_items(content: str) -> list:
+    """Every element the model produced, even when the array is truncated or
+    wrapped in prose."""
+    start = content.find("[")
+    if start != -1:
+        end = content.rfind("]")
+        # A complete array first, then a truncated one.
+        candidates = ((content[start : end + 1], False), (content[start:], True))
+        for candidate, partial in candidates:
+            try:
+                items = from_json(candidate, allow_partial=partial)
+            except ValueError:
+                continue
+            if isinstance(items, list):
+                return items
+    return list(_scan_objects(content))
+
+
+def _scan_objects(content: str) -> Iterator[dict]:
+    # Fallback for noisy output: every balanced top-level {...} that parses.
+    depth, start = 0, 0
+    in_string = escaped = False
+    for i, ch in enumerate(content):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"' and depth:
+            in_string = True
+        elif ch == "{":
+            if not depth:
+                start = i
+            depth += 1
+        elif ch == "}" and depth:
+            depth -= 1
+            if not depth:
+                try:
+                    item = from_json(content[start : i + 1])
+                except ValueError:
+                    continue
+                if isinstance(item, dict):
+                    yield item
+
+
+def _text(value) -> str | None:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str) or not value.strip():
+        return None
+    return value.strip()
+
+
+def _index(value, answers: list[str]) -> int | None:
+    if isinstance(value, str):
+        value = value.strip()
+        # correctAnswer is an index, only text that cannot be one names the
+        # answer: with options "1" to "4", "2" is still the third one.
+        if value.isascii() and value.isdigit():
+            value = int(value)
+        elif value in answers:
+            return answers.index(value)
+        else:
+            return None
+    if not isinstance(value, int) or isinstance(value, bool):
+        return None
+    return value if 0 <= value < len(answers) else None
+
+
+def _difficulty(value) -> int:
+    try:
+        difficulty = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_DIFFICULTY
+    return min(max(difficulty, 0), MAX_DIFFICULTY)
+
+
+def repair_card(item, type: DeckType) -> dict | None:
+    if not isinstance(item, dict):
+        return None
+    question = _text(item.get("question"))
+    if question is None:
+        return None
+
+    if type == DeckType.Flashcards:
+        answer = _text(item.get("answer"))
+        if answer is None:
+            return None
+        return {"question": question, "answer": answer}
+
+    answers = item.get("answers")
+    if not isinstance(answers, list):
+        return None
+    answers = [_text(a) for a in answers]
+    if None in answers:
+        return None
+    correct = _index(item.get("correctAnswer"), answers)
+    if correct is None:
+        return None
+    if len(answers) > QUIZ_ANSWERS:
+        # Keep the correct option and the first distractors.
+        others = [i for i in range(len(answers)) if i != correct]
+        kept = sorted(others[: QUIZ_ANSWERS - 1] + [correct])
+        correct = kept.index(correct)
+        answers = [answers[i] for i in kept]
+    # Missing options cannot be made up, and duplicates make the card ambiguous.
+    if len(answers) != QUIZ_ANSWERS or len(set(answers)) != QUIZ_ANSWERS:
+        return None
+    return {
+        "question": question,
+        "answers": answers,
+        "correctAnswer": correct,
+        "difficulty": _difficulty(item.get("difficulty")),
+    }
+
+
+def parse_card(
+    item, type: DeckType
+) -> LMFlashCardResponse | LMQuizCardResponse | None:
+    repaired = repair_card(item, type)
+    if repaired is None:
+        logger.warning(f"Dropping malformed card: {item!r}")
+        return None
+    model = LMFlashCardResponse if type == DeckType.Flashcards else LMQuizCardResponse
+    try:
+        return model.model_validate(repaired)
+    except ValidationError as e:
+        logger.warning(e)
+        return None
+
+
+def parse_cards(
+    content: str, type: DeckType
+) -> list[LMFlashCardResponse | LMQuizCardResponse]:
+    cards = (parse_card(item, type) for item in extract_items(content))
+    return [card for card in cards if card is not None]
@@ -0,0 +1,271 @@
+"""Minimal in-process metrics, rendered in the Prometheus text format."""
+
+import bisect
+import math
+import threading
+from typing import Callable, TypeVar
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(
+        f'{name}="{escape(value)}"' for name, value in zip(names, values)
+    )
+    return "{" + pairs + "}"
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.lock = threading.Lock()
+
+    def key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.type}",
+            *self.samples(),
+        ]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labels)
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, value: float = 1, **labels: str) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self) -> list[str]:
+        with self.lock:
+            return [
+                f"{self.name}{format_labels(self.labels, key)} {format_value(v)}"
+                for key, v in self.values.items()
+            ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: tuple[str, ...] = (),
+        *,
+        buckets: tuple[float, ...],
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self.key(labels)
+        with self.lock:
+            counts, total = self.values.setdefault(
+                key, ([0] * len(self.buckets), [0.0])
+            )
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def samples(self) -> list[str]:
+        lines = []
+        with self.lock:
+            for key, (counts, total) in self.values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = format_labels(
+                        self.labels + ("le",), key + (format_value(bound),)
+                    )
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.labels, key)
+                lines.append(f"{self.name}_sum{labels} {format_value(total[0])}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+M = TypeVar("M", bound=Metric)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: list[Metric] = []
+        self.collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: M) -> M:
+        self.metrics.append(metric)
+        return metric
+
+    def on_collect(self, collector: Callable[[], None]) -> None:
+        # Called before rendering, for gauges that are read from live state.
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collect in self.collectors:
+            collect()
+        lines = [line for metric in self.metrics for line in metric.render()]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+SECONDS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+TOKENS = (64, 128, 256, 512, 1024, 2048, 3072, 4096, 8192)
+
+llm_requests = registry.register(
+    Counter(
+        "llm_requests_total",
+        "Model calls by outcome.",
+        ("type", "backend", "status"),
+    )
+)
+llm_prompt_tokens = registry.register(
+    Counter(
+        "llm_prompt_tokens_total",
+        "Prompt tokens evaluated by the model.",
+        ("type", "backend"),
+    )
+)
+llm_completion_tokens = registry.register(
+    Counter(
+        "llm_completion_tokens_total",
+        "Tokens generated by the model.",
+        ("type", "backend"),
+    )
+)
+llm_tokens_per_second = registry.register(
+    Histogram(
+        "llm_tokens_per_second",
+        "Generation speed of a model call.",
+        ("type", "backend"),
+        buckets=(5, 10, 20, 30, 40, 60, 80, 120, 200),
+    )
+)
+llm_prompt_tokens_per_second = registry.register(
+    Histogram(
+        "llm_prompt_tokens_per_second",
+        "Prompt evaluation speed of a model call.",
+        ("type", "backend"),
+        buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000),
+    )
+)
+llm_time_to_first_token = registry.register(
+    Histogram(
+        "llm_time_to_first_token_seconds",
+        "Time until the first generated token.",
+        ("type", "backend"),
+        buckets=SECONDS,
+    )
+)
+llm_load_duration = registry.register(
+    Histogram(
+        "llm_load_duration_seconds",
+        "Time the model server spent loading the model for a call.",
+        ("type", "backend"),
+        buckets=SECONDS,
+    )
+)
+llm_request_duration = registry.register(
+    Histogram(
+        "llm_request_duration_seconds",
+        "Total duration of a model call as reported by the model server.",
+        ("type", "backend"),
+        buckets=SECONDS,
+    )
+)
+llm_queue_wait = registry.register(
+    Histogram(
+        "llm_queue_wait_seconds",
+        "Time a chunk waited for a generation slot.",
+        ("type",),
+        buckets=SECONDS,
+    )
+)
+llm_chunks_per_request = registry.register(
+    Histogram(
+        "llm_chunks_per_request",
+        "Number of chunks a generation request was split into.",
+        ("type",),
+        buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+    )
+)
+llm_chunk_tokens = registry.register(
+    Histogram(
+        "llm_chunk_tokens",
+        "Input tokens per chunk, prompt excluded.",
+        ("type",),
+        buckets=TOKENS,
+    )
+)
+llm_backend_up = registry.register(
+    Gauge("llm_backend_up", "Whether a backend's circuit is closed.", ("backend",))
+)
+llm_backend_in_flight = registry.register(
+    Gauge("llm_backend_in_flight", "Model calls in flight.", ("backend",))
+)
+llm_scheduler_queued = registry.register(
+    Gauge("llm_scheduler_queued", "Chunks waiting for a generation slot.")
+)
+
+
+def observe_response(
+    res: dict, *, type: str, backend: str, ttft: float | None = None
+) -> None:
+    """Records the timings Ollama reports in a final response (nanoseconds)."""
+    labels = {"type": type, "backend": backend}
+    prompt_tokens = res.get("prompt_eval_count", 0)
+    eval_tokens = res.get("eval_count", 0)
+    prompt_seconds = res.get("prompt_eval_duration", 0) / 1e9
+    eval_seconds = res.get("eval_duration", 0) / 1e9
+    load_seconds = res.get("load_duration", 0) / 1e9
+
+    llm_requests.inc(status="ok", **labels)
+    llm_prompt_tokens.inc(prompt_tokens, **labels)
+    llm_completion_tokens.inc(eval_tokens, **labels)
+    if eval_seconds:
+        llm_tokens_per_second.observe(eval_tokens / eval_seconds, **labels)
+    if prompt_seconds:
+        llm_prompt_tokens_per_second.observe(prompt_tokens / prompt_seconds, **labels)
+    if "load_duration" in res:
+        llm_load_duration.observe(load_seconds, **labels)
+    if "total_duration" in res:
+        llm_request_duration.observe(res["total_duration"] / 1e9, **labels)
+    if ttft is None and ("prompt_eval_duration" in res or "load_duration" in res):
+        # Without streaming the first token is ready once the prompt is evaluated.
+        ttft = load_seconds + prompt_seconds
+    if ttft is not None:
+        llm_time_to_first_token.observe(ttft, **labels)
@@ -0,0 +1,177 @@
+from collections import Counter, defaultdict
+import re
+import unicodedata
+
+from app.core.config import settings
+
+
+hyphen_break = re.compile(r"(\w)[-‐]\n(?=\w)")
+spaces = re.compile(r"[^\S\n]+")
+digits = re.compile(r"\d+")
+word = re.compile(r"\w+")
+sentence_end = re.compile(r"[.!?:;…\"'”’)\]]$")
+# NFKC would also fold "mc²" into "mc2" and "x₂" into "x2", so only the
+# ligatures PDF extraction produces are spelled out.
+ligatures = str.maketrans(
+    {
+        "ﬀ": "ff",
+        "ﬁ": "fi",
+        "ﬂ": "fl",
+        "ﬃ": "ffi",
+        "ﬄ": "ffl",
+        "ﬅ": "st",
+        "ﬆ": "st",
+    }
+)
+
+# Lines longer than this are content, even if repeated.
+MAX_BOILERPLATE_LEN = 100
+# Headers, footers and page numbers are looked for among the first and last
+# lines of a page only.
+EDGE_LINES = 2
+SHINGLE_SIZE = 3
+# Shingles shared by more paragraphs than this are too common to find duplicates.
+MAX_POSTINGS = 50
+
+
+class PreprocessedText:
+    def __init__(self, text: str, *, chars_before: int) -> None:
+        self.text = text
+        self.chars_before = chars_before
+        self.removed_lines = 0
+        self.removed_paragraphs = 0
+
+    @property
+    def chars_after(self) -> int:
+        return len(self.text)
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFC", text).translate(ligatures)
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    text = "".join(
+        # Drops control and format characters, soft hyphens among them. Form
+        # feeds are kept, PDF extraction puts them between pages.
+        ch
+        for ch in text
+        if ch in "\n\t\f" or unicodedata.category(ch)[0] != "C"
+    )
+    return "\n".join(
+        "\f".join(spaces.sub(" ", part).strip() for part in line.split("\f"))
+        for line in text.split("\n")
+    )
+
+
+def dehyphenate(text: str) -> str:
+    # "trans-\nport" -> "transport", only when the next line goes on in lowercase.
+    return hyphen_break.sub(
+        lambda m: m[1] if text[m.end()].islower() else m[0], text
+    )
+
+
+def unwrap_lines(lines: list[str]) -> list[str]:
+    # PDF extraction breaks paragraphs at every line, rejoin lines that stop
+    # mid-sentence and continue in lowercase.
+    unwrapped: list[str] = []
+    for line in lines:
+        if (
+            unwrapped
+            and unwrapped[-1]
+            and line[:1].islower()
+            and not sentence_end.search(unwrapped[-1])
+        ):
+            unwrapped[-1] += " " + line
+        else:
+            unwrapped.append(line)
+    return unwrapped
+
+
+def boilerplate_key(line: str) -> str:
+    # Running headers and page numbers differ only by their numbers.
+    return digits.sub("#", line.casefold())
+
+
+def page_edges(page: list[str]) -> set[int]:
+    content = [i for i, line in enumerate(page) if line]
+    return {*content[:EDGE_LINES], *content[-EDGE_LINES:]}
+
+
+def remove_boilerplate(pages: list[list[str]]) -> tuple[list[str], int]:
+    """Drops lines at page edges that recur at the edges of enough other pages.
+    Without page breaks nothing is removed: a repeated line in running text is
+    content."""
+    edges = [page_edges(page) for page in pages]
+
+    counts: Counter[str] = Counter()
+    for page, page_edge in zip(pages, edges):
+        counts.update(
+            {
+                boilerplate_key(page[i])
+                for i in page_edge
+                if len(page[i]) <= MAX_BOILERPLATE_LEN
+            }
+        )
+    min_repeats = max(settings.llm_boilerplate_min_repeats, 2)
+
+    kept: list[str] = []
+    for page, page_edge in zip(pages, edges):
+        kept.extend(
+            line
+            for i, line in enumerate(page)
+            if i not in page_edge
+            or len(line) > MAX_BOILERPLATE_LEN
+            or counts[boilerplate_key(line)] < min_repeats
+        )
+    return kept, sum(len(page) for page in pages) - len(kept)
+
+
+def shingles(paragraph: str) -> set[int]:
+    words = word.findall(paragraph.casefold())
+    if len(words) < SHINGLE_SIZE:
+        return {hash(tuple(words))}
+    return {
+        hash(tuple(words[i : i + SHINGLE_SIZE]))
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def remove_duplicates(paragraphs: list[str]) -> tuple[list[str], int]:
+    threshold = settings.llm_near_duplicate_threshold
+    seen: set[str] = set()
+    postings: defaultdict[int, list[int]] = defaultdict(list)
+    kept_shingles: list[set[int]] = []
+    kept: list[str] = []
+
+    for paragraph in paragraphs:
+        key = " ".join(word.findall(paragraph.casefold()))
+        if key in seen:
+            continue
+        current = shingles(paragraph)
+        # Jaccard similarity against earlier paragraphs sharing any shingle.
+        shared: Counter[int] = Counter()
+        for s in current:
+            if len(postings[s]) <= MAX_POSTINGS:
+                shared.update(postings[s])
+        if any(
+            n / len(current | kept_shingles[j]) >= threshold
+            for j, n in shared.items()
+        ):
+            continue
+
+        seen.add(key)
+        for s in current:
+            postings[s].append(len(kept))
+        kept_shingles.append(current)
+        kept.append(paragraph)
+
+    return kept, len(paragraphs) - len(kept)
+
+
+def preprocess(text: str) -> PreprocessedText:
+    result = PreprocessedText(text, chars_before=len(text))
+    pages = [page.split("\n") for page in dehyphenate(normalize(text)).split("\f")]
+    lines, result.removed_lines = remove_boilerplate(pages)
+    paragraphs = [p for p in unwrap_lines(lines) if p]
+    paragraphs, result.removed_paragraphs = remove_duplicates(paragraphs)
+    result.text = "\n".join(paragraphs)
+    return result
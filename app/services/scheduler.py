@@ -0,0 +1,126 @@
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+import time
+from typing import AsyncIterator
+
+from app.models.llm import SchedulerStats, SchedulerUserStats
+
+
+class _UserStats:
+    def __init__(self) -> None:
+        self.in_flight = 0
+        self.dispatched = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.last_seen = time.monotonic()
+
+
+class FairScheduler:
+    """Hands out up to `concurrency` slots, rotating between users round-robin.
+
+    Every user has a FIFO of waiters; when a slot frees up it goes to the head of
+    the next user's queue, so a user with hundreds of queued chunks gets one slot
+    per turn like everyone else instead of blocking them.
+    """
+
+    __idle_stats_ttl = 600
+
+    def __init__(self, concurrency: int) -> None:
+        self.concurrency = concurrency
+        self.__active = 0
+        self.__queues: dict[str, deque[asyncio.Future]] = {}
+        self.__turns: deque[str] = deque()
+        self.__stats: dict[str, _UserStats] = {}
+
+    @asynccontextmanager
+    async def slot(self, user_id: str) -> AsyncIterator[None]:
+        stats = self.__stats.setdefault(user_id, _UserStats())
+        started = time.monotonic()
+        await self.__acquire(user_id)
+        waited = time.monotonic() - started
+        stats.dispatched += 1
+        stats.wait_total += waited
+        stats.wait_max = max(stats.wait_max, waited)
+        stats.in_flight += 1
+        try:
+            yield
+        finally:
+            stats.in_flight -= 1
+            stats.last_seen = time.monotonic()
+            self.__release()
+
+    async def __acquire(self, user_id: str) -> None:
+        if self.__active < self.concurrency and not self.__turns:
+            self.__active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self.__queues.get(user_id)
+        if queue is None:
+            queue = self.__queues[user_id] = deque()
+            self.__turns.append(user_id)
+        queue.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over right before the cancellation.
+                self.__release()
+            elif future in queue:
+                # __release may already have dropped the cancelled future, and
+                # with it the queue, which a later waiter may have replaced.
+                queue.remove(future)
+                if not queue and self.__queues.get(user_id) is queue:
+                    del self.__queues[user_id]
+                    self.__turns.remove(user_id)
+            raise
+
+    def __release(self) -> None:
+        while self.__turns:
+            user_id = self.__turns.popleft()
+            queue = self.__queues[user_id]
+            future = queue.popleft()
+            if queue:
+                self.__turns.append(user_id)
+            else:
+                del self.__queues[user_id]
+            if not future.done():
+                # The slot passes straight to the waiter, __active is unchanged.
+                future.set_result(None)
+                return
+        self.__active -= 1
+
+    def stats(self, user_id: str | None = None) -> SchedulerStats:
+        """Totals, and per user stats for `user_id` only if given."""
+        now = time.monotonic()
+        users = []
+        for id, stats in list(self.__stats.items()):
+            queued = len(self.__queues.get(id, ()))
+            if (
+                not queued
+                and not stats.in_flight
+                and now - stats.last_seen > self.__idle_stats_ttl
+            ):
+                del self.__stats[id]
+                continue
+            if user_id is not None and id != user_id:
+                continue
+            users.append(
+                SchedulerUserStats(
+                    user_id=id,
+                    queued=queued,
+                    in_flight=stats.in_flight,
+                    dispatched=stats.dispatched,
+                    avg_wait_seconds=(
+                        stats.wait_total / stats.dispatched if stats.dispatched else 0
+                    ),
+                    max_wait_seconds=stats.wait_max,
+                )
+            )
+        return SchedulerStats(
+            concurrency=self.concurrency,
+            in_flight=self.__active,
+            queued=sum(len(q) for q in self.__queues.values()),
+            users=users,
+        )
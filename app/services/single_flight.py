@@ -0,0 +1,50 @@
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class _Call(Generic[V]):
+    def __init__(self, task: asyncio.Task[V]) -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight(Generic[K, V]):
+    """Runs at most one computation per key; concurrent callers share its result.
+
+    The shared task is only cancelled once every caller waiting on it is gone.
+    """
+
+    def __init__(self) -> None:
+        self.__calls: dict[K, _Call[V]] = {}
+
+    def __contains__(self, key: K) -> bool:
+        return key in self.__calls
+
+    def __len__(self) -> int:
+        return len(self.__calls)
+
+    async def do(self, key: K, fn: Callable[[], Awaitable[V]]) -> V:
+        call = self.__calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn()))
+            self.__calls[key] = call
+            call.task.add_done_callback(lambda _: self.__forget(key, call))
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Forgotten first, so a caller arriving while the task unwinds
+                # starts a new one instead of joining a cancelled one.
+                self.__forget(key, call)
+                call.task.cancel()
+
+    def __forget(self, key: K, call: _Call[V]) -> None:
+        if self.__calls.get(key) is call:
+            del self.__calls[key]
@@ -0,0 +1,37 @@
+import asyncio
+import logging
+import signal
+from databases import Database
+from app.core.config import settings
+from app.services import llm_service, logger
+from app.services.jobs import GenerationJobWorker
+
+
+async def main() -> None:
+    database = Database(settings.db_url, min_size=2, max_size=10)
+    await database.connect()
+    await llm_service.warm_up()
+    await llm_service.start()
+
+    worker = GenerationJobWorker(
+        db=database, llm=llm_service, concurrency=max(settings.llm_job_workers, 1)
+    )
+    await worker.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await stop.wait()
+    finally:
+        await worker.stop()
+        await llm_service.close()
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig()
+    logger.setLevel(logging.DEBUG)
+    asyncio.run(main())
@@ -0,0 +1,124 @@
+"""Compare the per-row and set-based paths for inserting a deck's cards.
+
+Needs a migrated database at DB_URL, every write is rolled back. Run from the
+project root:
+    python -m benchmarks.bulk_insert [cards]
+"""
+
+import asyncio
+import sys
+import time
+from uuid import uuid4
+
+from databases import Database
+from databases.core import Connection
+
+from app.core.config import settings
+from app.db.tables import cards_table, question_options_table
+from app.models.card import CardCreateRequest
+from app.models.core import DeckType
+from app.repositories.cards import CardRepository
+
+
+def make_cards(count: int) -> list[CardCreateRequest]:
+    return [
+        CardCreateRequest(
+            question=f"Question {i}?",
+            options=[f"Option {i}.{j}" for j in range(4)],
+            correct_answer=i % 4,
+            difficulty=i % 3,
+        )
+        for i in range(count)
+    ]
+
+
+async def per_row_insert(
+    connection: Connection, deck_id: str, cards: list[CardCreateRequest]
+) -> list[str]:
+    # The original approach: one INSERT per card and per option, then an UPDATE.
+    result = []
+    for card in cards:
+        card_result = await connection.fetch_one(
+            cards_table.insert()
+            .values(
+                {
+                    "type": DeckType.Quiz,
+                    "question": card.question,
+                    "difficulty": card.difficulty,
+                    "deck_id": deck_id,
+                }
+            )
+            .returning(cards_table.c.id),
+        )
+        correct_answer_id = None
+        for i, option in enumerate(card.options):
+            option_result = await connection.fetch_one(
+                question_options_table.insert()
+                .values({"card_id": card_result.id, "answer": option})
+                .returning(question_options_table.c.id),
+            )
+            if card.correct_answer == i:
+                correct_answer_id = option_result.id
+        await connection.execute(
+            cards_table.update()
+            .where(cards_table.c.id == card_result.id)
+            .values({"correct_answer_id": correct_answer_id})
+        )
+        result.append(card_result.id)
+    return result
+
+
+async def create_deck(db: Database) -> str:
+    user = await db.fetch_one(
+        """
+        INSERT INTO users (username, email, password)
+        VALUES (:name, :email, '')
+        RETURNING id
+        """,
+        {"name": uuid4().hex[:32], "email": f"{uuid4().hex[:32]}@example.com"},
+    )
+    deck = await db.fetch_one(
+        """
+        INSERT INTO decks (title, type, user_id)
+        VALUES ('benchmark', 'Quiz', :user_id)
+        RETURNING id
+        """,
+        {"user_id": user.id},
+    )
+    return deck.id
+
+
+async def measure(db: Database, insert, cards, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        deck_id = await create_deck(db)
+        start = time.perf_counter()
+        async with db.transaction():
+            await insert(db.connection(), deck_id, cards)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    cards = make_cards(count)
+    db = Database(settings.db_url, force_rollback=True)
+    repository = CardRepository(db)
+
+    async def bulk_insert(connection, deck_id, cards):
+        return await repository.add_cards_to_deck(
+            connection=connection, deck_id=deck_id, deck_type="Quiz", cards=cards
+        )
+
+    await db.connect()
+    try:
+        print(f"{count} quiz cards, 4 options each")
+        for name, insert in (("per-row", per_row_insert), ("bulk", bulk_insert)):
+            elapsed = await measure(db, insert, cards)
+            print(f"{name}: {elapsed * 1000:.1f}ms")
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
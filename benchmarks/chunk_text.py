@@ -0,0 +1,70 @@
+"""Compare token counting strategies used when chunking large uploads.
+
+Run from the project root:
+    python -m benchmarks.chunk_text [words]
+"""
+
+import random
+import sys
+import time
+
+from app.core.config import settings
+from app.models.core import DeckType
+from app.services.llm import LLMService
+
+
+WORDS = (
+    "the cell membrane regulates transport of ions and molecules between the "
+    "cytoplasm and extracellular space while mitochondria produce atp through "
+    "oxidative phosphorylation and the nucleus stores genetic information"
+).split()
+
+
+def make_text(words: int, seed: int = 2011) -> str:
+    rng = random.Random(seed)
+    paragraphs, left = [], words
+    while left > 0:
+        size = min(left, rng.randint(20, 200))
+        paragraphs.append(" ".join(rng.choice(WORDS) for _ in range(size)) + ".")
+        left -= size
+    return "\n".join(paragraphs)
+
+
+def per_paragraph_tokenize(llm: LLMService, text: str) -> int:
+    # The original approach: one tokenize() call per paragraph, counting strings.
+    paragraphs = [p.strip() for p in text.split("\n") if p.strip()]
+    return sum(len(llm.tokenizer.tokenize(p)) for p in paragraphs)
+
+
+def measure(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    words = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    text = make_text(words)
+    llm = LLMService()
+    chunk_text = llm._LLMService__chunk_text
+
+    print(f"{words} words, {len(text)} chars")
+    elapsed = measure(lambda: per_paragraph_tokenize(llm, text))
+    print(f"per-paragraph tokenize: {elapsed:.3f}s")
+
+    for mode in ("exact", "estimate"):
+        settings.llm_token_counting = mode
+        chunks, _ = chunk_text(text, DeckType.Quiz)
+        elapsed = measure(lambda: chunk_text(text, DeckType.Quiz))
+        largest = max(len(llm.tokenizer.tokenize(c)) for c in chunks)
+        print(
+            f"chunk_text[{mode}]: {elapsed:.3f}s, "
+            f"{len(chunks)} chunks, largest {largest} tokens"
+        )
+
+
+if __name__ == "__main__":
+    main()
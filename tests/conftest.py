@@ -0,0 +1,9 @@
+import os
+
+# Settings are read at import time, these are never connected to.
+os.environ.setdefault("DB_URL", "postgresql://localhost/test")
+os.environ.setdefault("SA_DB_URL", "postgresql+psycopg://localhost/test")
+os.environ.setdefault("ACCESS_TOKEN", "test")
+os.environ.setdefault("REFRESH_TOKEN", "test")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "5")
+os.environ.setdefault("REFRESH_TOKEN_EXPIRE_MINUTES", "5")
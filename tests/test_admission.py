@@ -0,0 +1,15 @@
+import pytest
+
+from app.core.config import settings
+from app.services.admission import AdmissionController, AdmissionRejected
+
+
+def test_capacity_is_checked_before_the_demand_is_known():
+    admission = AdmissionController()
+    admission.check_capacity("a")
+    chunks = settings.llm_max_user_inflight_chunks
+    with admission.admit(user_id="a", chunks=chunks, tokens=1):
+        with pytest.raises(AdmissionRejected):
+            admission.check_capacity("a")
+        admission.check_capacity("b")
+    admission.check_capacity("a")
@@ -0,0 +1,180 @@
+from app.models.llm import LMFlashCardResponse, LMQuizCardResponse
+from app.services.dedup import Deduplicator, card_terms, deduplicate, similarity
+
+THRESHOLD = 0.75
+
+
+def card(question: str, answer: str) -> LMFlashCardResponse:
+    return LMFlashCardResponse(question=question, answer=answer)
+
+
+def score(a: LMFlashCardResponse, b: LMFlashCardResponse) -> float:
+    return similarity(card_terms(a), card_terms(b))
+
+
+def stream(cards: list) -> list:
+    dedup = Deduplicator(THRESHOLD)
+    return [c for c in cards if not dedup.is_duplicate(c)]
+
+
+powerhouse = [
+    card("What is the powerhouse of the cell?", "Mitochondria"),
+    card("Which organelle is known as the powerhouse of the cell?", "Mitochondria"),
+    card("What organelle is called the cell's powerhouse?", "The mitochondria"),
+    card("What is the powerhouse of a cell?", "Mitochondria"),
+]
+
+reworded = [
+    (
+        card("In what year did World War II end?", "1945"),
+        card("When did the Second World War end?", "In 1945"),
+    ),
+    (
+        card("What is the capital of France?", "Paris"),
+        card("Which city is the capital of France?", "Paris"),
+    ),
+    (
+        card("What gas do plants absorb during photosynthesis?", "Carbon dioxide"),
+        card("Which gas is absorbed by plants in photosynthesis?", "Carbon dioxide"),
+    ),
+    (
+        card("What is the chemical symbol for gold?", "Au"),
+        card("What is gold's chemical symbol?", "Au"),
+    ),
+    (
+        card("Who developed the theory of general relativity?", "Albert Einstein"),
+        card(
+            "Who is credited with the theory of general relativity?",
+            "Albert Einstein",
+        ),
+    ),
+    (
+        card("What is the largest planet in the solar system?", "Jupiter"),
+        card("Which planet is the largest in our solar system?", "Jupiter"),
+    ),
+    (
+        card("Which enzyme breaks down starch in the mouth?", "Salivary amylase"),
+        card("What enzyme in saliva breaks down starch?", "Salivary amylase"),
+    ),
+    (
+        card("What is the SI unit of force?", "Newton"),
+        card("Which SI unit measures force?", "The newton"),
+    ),
+    (
+        card("Is the mitochondrion the site of cellular respiration?", "True"),
+        card("The mitochondrion is the site of cellular respiration.", "True"),
+    ),
+]
+
+different = [
+    (
+        card("What is the powerhouse of the cell?", "Mitochondria"),
+        card("Which organelle has its own DNA?", "Mitochondria"),
+    ),
+    (
+        card("What is the capital of France?", "Paris"),
+        card("What is the capital of Germany?", "Berlin"),
+    ),
+    (
+        card("What gas do plants absorb during photosynthesis?", "Carbon dioxide"),
+        card("What gas do plants release during photosynthesis?", "Oxygen"),
+    ),
+    (
+        card("When did World War I end?", "1918"),
+        card("When did World War II end?", "1945"),
+    ),
+    (
+        card("Who wrote Hamlet?", "William Shakespeare"),
+        card("Who wrote Macbeth?", "William Shakespeare"),
+    ),
+    (
+        card("Who painted the Mona Lisa?", "Leonardo da Vinci"),
+        card("Who painted The Last Supper?", "Leonardo da Vinci"),
+    ),
+    (
+        card("What is the largest planet?", "Jupiter"),
+        card("Which planet has the Great Red Spot?", "Jupiter"),
+    ),
+    (
+        card("What surrounds the cell?", "Cell membrane"),
+        card("What structure controls what enters the cell?", "Cell membrane"),
+    ),
+    (
+        card("What is the derivative of sin x?", "cos x"),
+        card("What is the integral of sin x?", "-cos x"),
+    ),
+]
+
+# Answers that say nothing about the fact asked about.
+generic_answers = [
+    (
+        card("Which of the following are symptoms of flu?", "All of the above"),
+        card("Which of the following are symptoms of measles?", "All of the above"),
+    ),
+    (
+        card("Which of the following are true about mitosis?", "All of the above"),
+        card("Which of the following are true about meiosis?", "All of the above"),
+    ),
+    (
+        card("Which of these is not a prime number?", "None of the above"),
+        card("Which of these is not an even number?", "None of the above"),
+    ),
+    (
+        card("Is the sun a star?", "True"),
+        card("Is Sirius a star?", "True"),
+    ),
+]
+
+
+def test_reworded_cards_reach_the_threshold():
+    for a, b in reworded + list(zip(powerhouse, powerhouse[1:])):
+        assert score(a, b) >= THRESHOLD, (a.question, b.question)
+
+
+def test_different_facts_stay_below_the_threshold():
+    for a, b in different + generic_answers:
+        assert score(a, b) < THRESHOLD, (a.question, b.question)
+
+
+def test_shared_generic_answer_keeps_both_cards():
+    for pair in generic_answers:
+        assert deduplicate(list(pair), THRESHOLD) == list(pair)
+        assert stream(list(pair)) == list(pair)
+
+
+def test_reworded_group_is_reduced_to_one_card():
+    assert len(deduplicate(powerhouse, THRESHOLD)) == 1
+    assert len(stream(powerhouse)) == 1
+
+
+def test_batch_and_stream_drop_the_same_cards():
+    cards = [c for pair in reworded + different for c in pair] + powerhouse
+    batch = deduplicate(cards, THRESHOLD)
+    streamed = stream(cards)
+    assert len(batch) == len(streamed) < len(cards)
+    # The batch may pick another member of a group, never another group.
+    for a, b in zip(batch, streamed):
+        assert a is b or score(a, b) >= THRESHOLD
+
+
+def test_batch_keeps_the_most_informative_card_in_place():
+    cards = [
+        card("What is the capital of France?", "Paris"),
+        card("What is the powerhouse of the cell?", "Mitochondria"),
+        card("Which city is the capital of France?", "Paris"),
+    ]
+    assert deduplicate(cards, THRESHOLD) == [cards[2], cards[1]]
+
+
+def test_quiz_cards_compare_by_correct_answer():
+    a = LMQuizCardResponse(
+        question="What is the capital of France?",
+        answers=["Paris", "Lyon", "Nice", "Lille"],
+        correctAnswer=0,
+        difficulty=0,
+    )
+    shuffled = ["Lyon", "Paris", "Nice", "Lille"]
+    same = a.model_copy(update={"answers": shuffled, "correctAnswer": 1})
+    other = a.model_copy(update={"answers": shuffled, "correctAnswer": 0})
+    assert deduplicate([a, same], THRESHOLD) == [a]
+    assert deduplicate([a, other], THRESHOLD) == [a, other]
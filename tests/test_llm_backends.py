@@ -0,0 +1,44 @@
+import asyncio
+
+from app.services.llm_backends import CircuitBreaker, LLMRouter
+
+
+class Probe:
+    def __init__(self, healthy: bool) -> None:
+        self.healthy = healthy
+
+    async def __call__(self, client) -> bool:
+        return self.healthy
+
+
+def test_successful_probe_does_not_close_an_open_breaker():
+    router = LLMRouter(["fake://"])
+    backend = router.backends[0]
+    backend.probe = Probe(True)
+    backend.breaker.trip()
+    asyncio.run(router.probe(None))
+    assert backend.breaker.state == CircuitBreaker.Open
+    assert not backend.breaker.available
+
+
+def test_failed_probe_opens_the_breaker():
+    router = LLMRouter(["fake://"])
+    backend = router.backends[0]
+    backend.probe = Probe(False)
+    asyncio.run(router.probe(None))
+    assert backend.breaker.state == CircuitBreaker.Open
+
+
+def test_only_a_successful_trial_call_closes_the_breaker():
+    router = LLMRouter(["fake://"])
+    backend = router.backends[0]
+    backend.breaker.trip()
+    backend.breaker.opened_at -= backend.breaker.reset_timeout
+
+    async def call() -> None:
+        async with router.acquire() as picked:
+            assert picked is backend
+            assert backend.breaker.state == CircuitBreaker.HalfOpen
+
+    asyncio.run(call())
+    assert backend.breaker.state == CircuitBreaker.Closed
@@ -0,0 +1,57 @@
+from app.models.core import DeckType
+from app.services.llm_output import extract_items, parse_cards, repair_card
+
+
+def quiz(correct, answers=("Paris", "Lyon", "Nice", "Lille")) -> dict:
+    return {
+        "question": "What is the capital of France?",
+        "answers": list(answers),
+        "correctAnswer": correct,
+        "difficulty": 1,
+    }
+
+
+def test_truncated_array_keeps_the_complete_elements():
+    content = '[{"question": "Q1", "answer": "A1"}, {"question": "Q2", "ans'
+    cards = parse_cards(content, DeckType.Flashcards)
+    assert [(c.question, c.answer) for c in cards] == [("Q1", "A1")]
+
+
+def test_array_wrapped_in_prose():
+    content = 'Here are your cards:\n[{"question": "Q", "answer": "A"}]\nEnjoy!'
+    assert extract_items(content) == [{"question": "Q", "answer": "A"}]
+
+
+def test_objects_without_an_array():
+    content = 'Card 1: {"question": "Q1", "answer": "A1"} and {"question": "Q2"'
+    assert extract_items(content) == [{"question": "Q1", "answer": "A1"}]
+
+
+def test_extra_options_keep_the_correct_one():
+    item = quiz(4, ("Lyon", "Nice", "Lille", "Brest", "Paris"))
+    card = repair_card(item, DeckType.Quiz)
+    assert card["answers"] == ["Lyon", "Nice", "Lille", "Paris"]
+    assert card["correctAnswer"] == 3
+
+
+def test_missing_or_duplicate_options_are_dropped():
+    assert repair_card(quiz(0, ("Paris", "Lyon", "Nice")), DeckType.Quiz) is None
+    duplicates = quiz(0, ("Paris", "Lyon", "Lyon", "Nice"))
+    assert repair_card(duplicates, DeckType.Quiz) is None
+
+
+def test_string_index_is_read_as_an_index():
+    assert repair_card(quiz("2"), DeckType.Quiz)["correctAnswer"] == 2
+    numeric = quiz("2", ("1", "2", "3", "4"))
+    assert repair_card(numeric, DeckType.Quiz)["correctAnswer"] == 2
+
+
+def test_answer_text_is_matched_when_not_an_index():
+    assert repair_card(quiz("Paris"), DeckType.Quiz)["correctAnswer"] == 0
+    assert repair_card(quiz("Marseille"), DeckType.Quiz) is None
+
+
+def test_out_of_range_index_is_dropped():
+    assert repair_card(quiz(4), DeckType.Quiz) is None
+    assert repair_card(quiz("7"), DeckType.Quiz) is None
+    assert repair_card(quiz(True), DeckType.Quiz) is None
@@ -0,0 +1,58 @@
+from app.services.preprocessing import dehyphenate, normalize, preprocess
+
+
+def test_numbered_lines_are_content():
+    text = "Step 1: Add 5 ml of water\nStep 2: Add 10 ml\nStep 3: Add 20 ml"
+    assert preprocess(text).text.split("\n") == text.split("\n")
+
+
+def test_repeated_lines_without_page_breaks_are_kept():
+    text = "Answer: 42\nAnswer: 17\nAnswer: 3"
+    assert preprocess(text).text == text
+
+
+def test_bare_number_in_running_text_is_kept():
+    text = "The year was\n1945\nand the war ended."
+    assert preprocess(text).text.split() == text.split()
+
+
+def test_headers_and_page_numbers_at_page_edges_are_removed():
+    pages = [
+        f"Biology, chapter 2\n{body}\n{number}"
+        for number, body in enumerate(
+            [
+                "Cells are the unit of life.",
+                "Mitochondria produce energy.",
+                "Ribosomes build proteins.",
+            ],
+            start=1,
+        )
+    ]
+    result = preprocess("\f".join(pages))
+    assert result.text.split("\n") == [
+        "Cells are the unit of life.",
+        "Mitochondria produce energy.",
+        "Ribosomes build proteins.",
+    ]
+    assert result.removed_lines == 6
+
+
+def test_page_edge_lines_that_do_not_repeat_are_kept():
+    pages = ["Introduction\nCells are small.", "Summary\nCells divide."]
+    assert preprocess("\f".join(pages)).text.split("\n") == [
+        "Introduction",
+        "Cells are small.",
+        "Summary",
+        "Cells divide.",
+    ]
+
+
+def test_normalize_keeps_superscripts_and_subscripts():
+    assert normalize("E = mc², 10⁻³ mol of H₂O") == "E = mc², 10⁻³ mol of H₂O"
+    assert normalize("e\u0301\ufb01le\u00a0d") == "\u00e9file d"
+
+
+def test_dehyphenate_any_lowercase_script():
+    assert dehyphenate("кле-\nтина") == "клетина"
+    assert dehyphenate("trans-\nport") == "transport"
+    assert dehyphenate("Anti-\nInflammatory") == "Anti-\nInflammatory"
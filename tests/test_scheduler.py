@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from app.services.scheduler import FairScheduler
+
+
+async def hold(scheduler: FairScheduler, user_id: str, event: asyncio.Event) -> None:
+    async with scheduler.slot(user_id):
+        await event.wait()
+
+
+def test_waiter_cancelled_with_the_holder():
+    async def main() -> None:
+        scheduler = FairScheduler(1)
+        never = asyncio.Event()
+        holder = asyncio.create_task(hold(scheduler, "a", never))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold(scheduler, "a", never))
+        await asyncio.sleep(0)
+        # The holder releases while the waiter's cancellation is pending.
+        holder.cancel()
+        waiter.cancel()
+        results = await asyncio.gather(holder, waiter, return_exceptions=True)
+        assert all(isinstance(r, asyncio.CancelledError) for r in results)
+
+        stats = scheduler.stats()
+        assert (stats.in_flight, stats.queued) == (0, 0)
+        async with asyncio.timeout(1):
+            async with scheduler.slot("a"):
+                pass
+
+    asyncio.run(main())
+
+
+def test_timeout_while_waiting_raises_timeout_error():
+    async def main() -> None:
+        scheduler = FairScheduler(1)
+        release = asyncio.Event()
+        holder = asyncio.create_task(hold(scheduler, "a", release))
+        await asyncio.sleep(0)
+        with pytest.raises(TimeoutError):
+            async with asyncio.timeout(0.01):
+                await hold(scheduler, "b", release)
+        release.set()
+        await holder
+        assert scheduler.stats().queued == 0
+
+    asyncio.run(main())
+
+
+def test_stats_for_one_user_hide_the_others():
+    async def main() -> None:
+        scheduler = FairScheduler(2)
+        release = asyncio.Event()
+        tasks = [
+            asyncio.create_task(hold(scheduler, user_id, release))
+            for user_id in ("a", "b", "b")
+        ]
+        await asyncio.sleep(0)
+        stats = scheduler.stats(user_id="a")
+        assert [u.user_id for u in stats.users] == ["a"]
+        assert (stats.in_flight, stats.queued) == (2, 1)
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
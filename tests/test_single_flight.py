@@ -0,0 +1,48 @@
+import asyncio
+
+from app.services.single_flight import SingleFlight
+
+
+def test_caller_after_last_waiter_left_starts_a_new_call():
+    async def main() -> None:
+        flight: SingleFlight[str, str] = SingleFlight()
+
+        async def slow() -> str:
+            try:
+                await asyncio.Event().wait()
+            finally:
+                # Unwinding takes a while, new callers must not join it.
+                await asyncio.sleep(0.01)
+            return "never"
+
+        async def fast() -> str:
+            return "fresh"
+
+        first = asyncio.create_task(flight.do("k", slow))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        assert "k" not in flight
+        assert await flight.do("k", fast) == "fresh"
+        results = await asyncio.gather(first, return_exceptions=True)
+        assert isinstance(results[0], asyncio.CancelledError)
+
+    asyncio.run(main())
+
+
+def test_concurrent_callers_share_one_call():
+    async def main() -> None:
+        flight: SingleFlight[str, int] = SingleFlight()
+        calls = 0
+
+        async def work() -> int:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return calls
+
+        results = await asyncio.gather(*(flight.do("k", work) for _ in range(3)))
+        assert results == [1, 1, 1]
+        assert len(flight) == 0
+
+    asyncio.run(main())